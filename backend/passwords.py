@@ -0,0 +1,22 @@
+"""Password hashing.
+
+Kept apart from server.py so the processes of the import hash pool, which
+spawn fresh interpreters and import the function they run by module name,
+load only passlib and bcrypt instead of the whole app.
+"""
+import functools
+
+from passlib.context import CryptContext
+
+
+@functools.lru_cache(maxsize=None)
+def pwd_context() -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(plain_password, hashed_password)
@@ -1,36 +1,731 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
+import asyncio
+import contextlib
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import importlib
+import io
+import heapq
+import ipaddress
+import json
+import math
+import multiprocessing
+import pickle
+import random
+import re
+import secrets
+import socket
+import sqlite3
+import sys
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone, timedelta
+from pymongo import ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import jwt
 
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Startup profile: milliseconds spent per phase, startup hook and lazy import
+startup_profile = {
+    "phases": {"imports": round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)},
+    "hooks": {},
+    "lazy_imports": {},
+}
+
+def lazy_import(name: str):
+    """Import `name` on first use; feedparser, bs4, httpx and passlib are only
+    needed by the news sync and password paths, not to start serving."""
+    module = sys.modules.get(name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        startup_profile["lazy_imports"][name] = round((time.perf_counter() - started) * 1000, 1)
+    return module
+
+def startup_phase(hook):
+    """Record how long a startup hook takes in the startup profile"""
+    @functools.wraps(hook)
+    async def timed():
+        started = time.perf_counter()
+        try:
+            return await hook()
+        finally:
+            startup_profile["hooks"][hook.__name__] = round((time.perf_counter() - started) * 1000, 1)
+    return timed
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in list(self.values.items()):
+            yield self.name + format_labels(self.labels, labels), value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float):
+        self.values[labels] = value
+
+class Histogram:
+    """Cumulative-bucket histogram; one short lock per observation"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        for labels, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                yield self.name + "_bucket" + format_labels(self.labels, labels, f'le="{bound}"'), cumulative
+            yield self.name + "_sum" + format_labels(self.labels, labels), series[-1]
+            yield self.name + "_count" + format_labels(self.labels, labels), cumulative
+
+metrics_registry = []
+# Async callables run before each scrape, for gauges that are sampled rather
+# than updated on the hot path
+metrics_collectors = []
+
+def render_metrics() -> str:
+    lines = []
+    for metric in metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {value}")
+    return "\n".join(lines) + "\n"
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",))
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command"))
+mongo_command_failures = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ("collection", "command"))
+mongo_slow_commands = Counter(
+    "mongo_slow_commands_total", "MongoDB commands slower than SLOW_QUERY_MS", ("collection", "command"))
+outbound_http_duration = Histogram(
+    "outbound_http_duration_seconds", "Outbound HTTP request latency", ("host", "status"))
+
+# ASGI scope of the request being served. The router fills in scope["route"]
+# before the handler runs, and motor copies the context into its worker
+# threads, so the Mongo listener can tell which route issued a command.
+current_scope = contextvars.ContextVar("current_scope", default=None)
+
+def current_route() -> str:
+    scope = current_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return route.path if route is not None else scope.get("path", "unmatched")
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight gauge"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current_scope.set(scope)
+        method = scope["method"]
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        http_requests_in_flight.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec((method,))
+            route = scope.get("route")
+            http_request_duration.observe(
+                (method, route.path if route is not None else "unmatched", str(status_code)),
+                time.perf_counter() - started,
+            )
+
+# Tracing
+# A sampled request records a tree of spans: the request itself, auth and
+# bcrypt, every Mongo command and every outbound HTTP call, linked through
+# the current_span context variable (which motor's threads inherit too).
+# Unsampled requests create no spans at all. Finished traces are buffered
+# and written every TRACE_EXPORT_SECONDS by trace_writer to TRACE_EXPORTER:
+# "file" (rotating JSON lines, one per span) or "otlp" (OTLP/HTTP JSON to
+# TRACE_OTLP_URL). Every response carries its trace id in X-Trace-Id; an
+# incoming W3C traceparent is continued and its sampled flag honoured.
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "")  # "", "file" or "otlp"
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.environ.get("TRACE_FILE_BACKUPS", "3"))
+TRACE_OTLP_URL = os.environ.get("TRACE_OTLP_URL", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "backend")
+TRACE_EXPORT_SECONDS = float(os.environ.get("TRACE_EXPORT_SECONDS", "2"))
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", "1000"))
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+traces_recorded = Counter("traces_total", "Sampled request traces by outcome", ("outcome",))
+current_span = contextvars.ContextVar("current_span", default=None)
+finished_traces = deque()
+
+def trace_id_bits(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []  # finished spans; list.append is safe from motor's threads
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start", "end", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: str = "internal", **attributes):
+        self.trace = trace
+        self.span_id = trace_id_bits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    def finish(self, end: Optional[float] = None):
+        self.end = end or time.time()
+        self.trace.spans.append(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            "duration_ms": round((self.end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Child span of the current one for the duration of the block; a no-op
+    outside a sampled request"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, **attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+def traced(name: str):
+    """Run an async function (a route dependency, say) inside span(name)"""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_span(parent: Optional[Span], name: str, start: float, duration: float, error: Optional[str] = None,
+                **attributes):
+    """A span that has already ended, for callbacks that only see the timing"""
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent.span_id, "client", **attributes)
+    child.start = start
+    child.error = error
+    child.finish(start + duration)
+
+class TracingMiddleware:
+    """Root span per sampled request, X-Trace-Id on every response"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = TRACEPARENT.match(Headers(scope=scope).get("traceparent", ""))
+        if incoming:
+            trace_id, parent_id = incoming.group(1), incoming.group(2)
+            sampled = int(incoming.group(3), 16) & 1 == 1
+        else:
+            trace_id, parent_id = trace_id_bits(128), None
+            sampled = random.random() < TRACE_SAMPLE_RATE
+        root = None
+        if sampled and span_exporter is not None:
+            root = Span(Trace(trace_id), f"{scope['method']} {scope['path']}", parent_id, "server",
+                        method=scope["method"], path=scope["path"])
+        
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Trace-Id", trace_id)
+                if root is not None:
+                    root.attributes["status"] = message["status"]
+            await send(message)
+        
+        if root is None:
+            await self.app(scope, receive, send_with_trace)
+            return
+        token = current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            root.finish()
+            if len(finished_traces) >= TRACE_BUFFER_SIZE:
+                finished_traces.popleft()
+                traces_recorded.inc(("dropped",))
+            finished_traces.append(root.trace)
+            traces_recorded.inc(("sampled",))
+
+class FileSpanExporter:
+    """Appends one JSON line per span, rotating the file at TRACE_FILE_MAX_BYTES"""
+    name = "file"
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    async def export(self, batch: List[Trace]):
+        lines = "".join(
+            json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+            for trace in batch for span in trace.spans)
+        await asyncio.to_thread(self.append, lines)
+
+    def append(self, lines: str):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def rotate(self):
+        """traces.jsonl -> traces.jsonl.1 -> ... -> traces.jsonl.<backups>, dropping the oldest"""
+        if self.backups == 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    return {"stringValue": str(value)}
+
+class OtlpSpanExporter:
+    """POSTs batches in the OTLP/HTTP JSON encoding to a collector"""
+    name = "otlp"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def export(self, batch: List[Trace]):
+        spans = [{
+            "traceId": span.trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": SPAN_KINDS[span.kind],
+            "startTimeUnixNano": str(int(span.start * 1e9)),
+            "endTimeUnixNano": str(int(span.end * 1e9)),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        } for trace in batch for span in trace.spans]
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "server"}, "spans": spans}],
+        }]}
+        async with http_client(timeout=10.0) as client:
+            response = await client.post(self.url, json=body)
+            response.raise_for_status()
+
+def make_span_exporter():
+    if TRACE_EXPORTER == "file":
+        return FileSpanExporter(TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS)
+    if TRACE_EXPORTER == "otlp":
+        return OtlpSpanExporter(TRACE_OTLP_URL)
+    return None
+
+span_exporter = make_span_exporter()
+
+async def export_traces() -> int:
+    """Hand every finished trace to the exporter; returns how many"""
+    batch = list(finished_traces)
+    finished_traces.clear()
+    if batch:
+        try:
+            await span_exporter.export(batch)
+        except Exception:
+            traces_recorded.inc(("dropped",), len(batch))
+            raise
+        traces_recorded.inc(("exported",), len(batch))
+    return len(batch)
+
+async def trace_writer():
+    while True:
+        await asyncio.sleep(TRACE_EXPORT_SECONDS)
+        try:
+            await export_traces()
+        except Exception as e:
+            logger.error(f"Error exporting traces: {e}")
+
+# Slow-query log
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "200"))
+
+# Where each command keeps its filter, and the commands `explain` accepts
+QUERY_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+# Driver-added fields that must not be sent back inside an explain
+SESSION_FIELDS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "readConcern", "writeConcern")
+
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+event_loop = None  # set on startup so listener threads can schedule explains
+
+def query_shape(value):
+    """Replace literal values with their type names, keeping operators and keys"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item) for item in value[:1]] + (["..."] if len(value) > 1 else [])
+    return type(value).__name__
+
+def command_filter(command: dict, command_name: str):
+    value = command.get(QUERY_FIELDS.get(command_name, ""), {})
+    if command_name in ("update", "delete") and value:
+        value = value[0].get("q", {})
+    return value
+
+def returned_count(reply: dict):
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return reply.get("n")
+
+def summarize_explain(plan: dict) -> dict:
+    stats = plan.get("executionStats", {})
+    winning = plan.get("queryPlanner", {}).get("winningPlan", {})
+    stages = []
+    while winning:
+        stages.append(winning.get("stage"))
+        winning = winning.get("inputStage")
+    return {
+        "stages": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "execution_time_ms": stats.get("executionTimeMillis"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+async def capture_explain(entry: dict, command: dict):
+    explained = {key: value for key, value in command.items() if key not in SESSION_FIELDS}
+    try:
+        plan = await db.command({"explain": explained, "verbosity": "executionStats"})
+        entry["explain"] = summarize_explain(plan)
+    except Exception as e:
+        entry["explain"] = {"error": str(e)}
+
+def record_slow_query(collection: str, command: dict, event, route: str):
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "route": route,
+        "collection": collection,
+        "command": event.command_name,
+        "duration_ms": round(event.duration_micros / 1000, 2),
+        "filter": query_shape(command_filter(command, event.command_name)),
+        "sort": command.get("sort"),
+        "returned": returned_count(event.reply),
+        "explain": None,
+    }
+    slow_queries.append(entry)
+    mongo_slow_commands.inc((collection, event.command_name))
+    logger.warning(
+        f"Slow query {entry['duration_ms']}ms on {collection}.{event.command_name} "
+        f"from {route}: filter={entry['filter']} sort={entry['sort']} returned={entry['returned']}"
+    )
+    if event_loop is not None and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+        event_loop.call_soon_threadsafe(asyncio.ensure_future, capture_explain(entry, command))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends; runs on motor's worker threads"""
+    def __init__(self):
+        self.pending = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else "-"
+        self.pending[(event.connection_id, event.request_id)] = (
+            collection, event.command, current_route(), current_span.get())
+
+    def succeeded(self, event):
+        collection, command, route, parent = self.pending.pop(
+            (event.connection_id, event.request_id), ("-", {}, "-", None))
+        duration = event.duration_micros / 1e6
+        mongo_command_duration.observe((collection, event.command_name), duration)
+        record_span(parent, f"mongo.{event.command_name}", time.time() - duration, duration, collection=collection)
+        if event.duration_micros >= SLOW_QUERY_MS * 1000 and event.command_name in QUERY_FIELDS:
+            record_slow_query(collection, command, event, route)
+
+    def failed(self, event):
+        collection, _, _, parent = self.pending.pop((event.connection_id, event.request_id), ("-", {}, "-", None))
+        duration = event.duration_micros / 1e6
+        mongo_command_duration.observe((collection, event.command_name), duration)
+        mongo_command_failures.inc((collection, event.command_name))
+        record_span(parent, f"mongo.{event.command_name}", time.time() - duration, duration,
+                    error=str(event.failure.get("codeName", "error")), collection=collection)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['military_db']]
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.environ.get("SECRET_KEY", "92d90ba580d0b62eda00fd5b7458453c")
 ALGORITHM = "HS256"
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+# Leases
+# Work that must happen once per fleet rather than once per worker (seeding,
+# migrations, index builds, periodic archiving) runs under a lease: a leases
+# document naming its holder and when it expires. The holder renews it every
+# LEASE_TTL_SECONDS / 3 while working and deletes it when done; if the holder
+# dies the lease lapses and another worker may take it. Expiry uses each
+# worker's clock, so the TTL must comfortably exceed clock skew.
+#
+# Startup maintenance tasks run concurrently under the "startup" lease, each
+# once its `after` tasks are done. A task that completes is recorded in the
+# maintenance collection with the deploy it ran for (DEPLOY_ID, by default a
+# hash of this file) and the values of its `config` settings; restarts and
+# workers of the same deploy skip it.
+LEASE_TTL_SECONDS = float(os.environ.get("LEASE_TTL_SECONDS", "30"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+lease_acquisitions = Counter("lease_acquisitions_total", "Lease attempts by name and outcome", ("name", "outcome"))
+DEPLOY_ID = os.environ.get("DEPLOY_ID") or hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
+maintenance_tasks = {}  # name -> (hook, names of tasks to run first, names of settings it depends on)
+
+async def acquire_lease(name: str, ttl: float = LEASE_TTL_SECONDS) -> bool:
+    """Take or extend `name` unless another worker holds it unexpired"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.update_one(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=ttl), "acquired_at": now}},
+            upsert=True)
+    except DuplicateKeyError:
+        # The filter missed an existing document: someone else holds it
+        lease_acquisitions.inc((name, "held"))
+        return False
+    lease_acquisitions.inc((name, "acquired"))
+    return True
+
+async def renew_lease(name: str, ttl: float):
+    while True:
+        await asyncio.sleep(ttl / 3)
+        result = await db.leases.update_one(
+            {"_id": name, "holder": WORKER_ID},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)}})
+        if result.matched_count == 0:
+            lease_acquisitions.inc((name, "lost"))
+            logger.warning(f"Lease {name} lost while held by {WORKER_ID}")
+            return
+
+@contextlib.asynccontextmanager
+async def lease(name: str, ttl: float = LEASE_TTL_SECONDS):
+    """Yield True, renewing in the background, if this worker got `name`; else False"""
+    if not await acquire_lease(name, ttl):
+        yield False
+        return
+    renewer = asyncio.create_task(renew_lease(name, ttl))
+    try:
+        yield True
+    finally:
+        renewer.cancel()
+        await db.leases.delete_one({"_id": name, "holder": WORKER_ID})
+
+def maintenance_task(hook=None, *, after: tuple = (), config: tuple = ()):
+    """Register a startup hook that runs on one worker per deploy, see
+    run_maintenance_tasks(). `after` names tasks that must finish first;
+    changing a setting named in `config` makes the task run again."""
+    def register(hook):
+        maintenance_tasks[hook.__name__] = (hook, after, config)
+        return hook
+    return register(hook) if hook is not None else register
+
+def maintenance_version(config: tuple) -> str:
+    return ":".join([DEPLOY_ID, *(str(globals()[name]) for name in config)])
+
+# Units
+# One deployment serves many units over shared workers and connection pools.
+# Every document a unit owns carries its unit_id, every query filters on it
+# and every cache key and tag is prefixed with it (see scoped()). Signed-in
+# requests take the unit from the token; anonymous ones from X-Unit-Id.
+# Operational routes that span every unit (/admin/cache, slow queries,
+# compaction, the notification outbox) are for default-unit admins only.
+DEFAULT_UNIT_ID = os.environ.get("DEFAULT_UNIT_ID", "default")
+UNIT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,31}$")
+TENANT_COLLECTIONS = ("users", "groups", "duties", "duties_archive", "news", "news_archive", "settings")
+
+def scoped(unit_id: str, name: str) -> str:
+    """Cache key or tag `name` within one unit"""
+    return f"{unit_id}:{name}"
+
+async def get_request_unit(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+                           x_unit_id: Optional[str] = Header(None)) -> str:
+    """Unit of a request to a route open to anonymous callers: the token's,
+    else X-Unit-Id, else the default unit. An invalid token counts as none;
+    these routes serve nothing a caller couldn't get with the header."""
+    if credentials is not None:
+        try:
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.InvalidTokenError:
+            payload = None
+        if payload is not None:
+            return payload.get("unit", DEFAULT_UNIT_ID)
+    if not x_unit_id:
+        return DEFAULT_UNIT_ID
+    if not UNIT_ID_PATTERN.match(x_unit_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Unit-Id")
+    return x_unit_id
+
+@maintenance_task
+@startup_phase
+async def assign_default_unit():
+    """Documents written before units existed belong to the default unit"""
+    await asyncio.gather(*(
+        db[name].update_many({"unit_id": None}, {"$set": {"unit_id": DEFAULT_UNIT_ID}})
+        for name in TENANT_COLLECTIONS + tuple(await duty_partition_names())))
+    # Month rosters are keyed by unit now; the old ones rebuild on read
+    await db.rosters.delete_many({"unit_id": None})
+
+@maintenance_task(after=("assign_default_unit",))
+@startup_phase
+async def ensure_unit_indexes():
+    await asyncio.gather(
+        db.users.create_index("id"),
+        # Unique so concurrent registrations of one address can't both land
+        db.users.create_index("email", unique=True),
+        db.users.create_index([("unit_id", 1), ("id", 1)]),
+        db.groups.create_index([("unit_id", 1), ("id", 1)]),
+        db.groups.create_index([("unit_id", 1), ("member_ids", 1)]),
+        db.settings.create_index("unit_id", unique=True),
+        db.rosters.create_index("unit_id"),
+    )
+
 # Models
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -40,6 +735,8 @@ class User(BaseModel):
     rank: Optional[str] = None  # військове звання
     role: str = "user"  # "user" or "admin"
     verified: bool = False
+    unit_id: str = DEFAULT_UNIT_ID
+    version: int = 0  # bumped on every edit, sent back in If-Match
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
@@ -68,17 +765,57 @@ class News(BaseModel):
     is_external: bool = False
     external_url: Optional[str] = None
     source: Optional[str] = None
+    pinned: bool = False  # Never moved to the news archive
+    unit_id: str = DEFAULT_UNIT_ID
+    version: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class NewsCreate(BaseModel):
     title: str
     content: str
     image_url: Optional[str] = None
+    pinned: bool = False
 
 class NewsUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
     image_url: Optional[str] = None
+    pinned: Optional[bool] = None
+
+class NewsSource(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str  # shown as the news author
+    feed_url: str
+    source: str  # label stored on each item, e.g. "armyinform.com.ua"
+    author_id: str
+    poll_interval_seconds: int = 3600  # 0: only synced by hand
+    max_items: int = 10
+    image_strategy: str = "page"  # see NEWS_IMAGE_STRATEGIES
+    enabled: bool = True
+    unit_id: str = DEFAULT_UNIT_ID
+    next_poll_at: Optional[datetime] = None
+    last_result: Optional[dict] = None
+    version: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class NewsSourceCreate(BaseModel):
+    name: str
+    feed_url: str
+    source: Optional[str] = None  # defaults to the feed's host
+    poll_interval_seconds: int = 3600
+    max_items: int = 10
+    image_strategy: str = "page"
+    enabled: bool = True
+
+class NewsSourceUpdate(BaseModel):
+    name: Optional[str] = None
+    feed_url: Optional[str] = None
+    source: Optional[str] = None
+    poll_interval_seconds: Optional[int] = None
+    max_items: Optional[int] = None
+    image_strategy: Optional[str] = None
+    enabled: Optional[bool] = None
 
 class DutyRoster(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -86,6 +823,7 @@ class DutyRoster(BaseModel):
     user_id: str
     user_name: str
     duty_date: str  # Date in ISO format (YYYY-MM-DD)
+    unit_id: str = DEFAULT_UNIT_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class DutyRosterCreate(BaseModel):
@@ -98,14 +836,22 @@ class DutyRosterBulkCreate(BaseModel):
 class UserDutiesUpdate(BaseModel):
     dates: List[str]
 
+class MemberDuties(BaseModel):
+    user_id: str
+    full_name: str
+    rank: Optional[str] = None
+    duties: List[DutyRoster] = []
+
 class Settings(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = "military_unit_settings"
+    unit_id: str = DEFAULT_UNIT_ID
     unit_name: str = "Военная Часть"
     unit_subtitle: str = "Информационная Система"
     unit_icon: str = "https://cdn-icons-png.flaticon.com/512/2913/2913133.png"
     news_title: str = "Новости Части"
     news_subtitle: str = "Актуальная информация и объявления военной части"
+    version: int = 0
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class SettingsUpdate(BaseModel):
@@ -121,6 +867,8 @@ class Group(BaseModel):
     name: str
     description: Optional[str] = None
     member_ids: List[str] = []
+    unit_id: str = DEFAULT_UNIT_ID
+    version: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class GroupCreate(BaseModel):
@@ -132,6 +880,17 @@ class GroupUpdate(BaseModel):
     description: Optional[str] = None
     member_ids: Optional[List[str]] = None
 
+class UnitCreate(BaseModel):
+    unit_id: str
+    unit_name: str
+    admin_email: EmailStr
+    admin_password: str
+    admin_full_name: str
+
+class UserImport(BaseModel):
+    users: List[dict]  # [{ email, password, full_name, rank }]
+    group_id: Optional[str] = None
+
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -141,10 +900,12 @@ class UserUpdate(BaseModel):
 
 # Helper functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("bcrypt.verify"):
+        return lazy_import("passwords").verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with span("bcrypt.hash"):
+        return lazy_import("passwords").hash_password(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)):
     to_encode = data.copy()
@@ -153,7 +914,57 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+class TokenClaims(BaseModel):
+    """What an access token says about its holder, enough for authorization"""
+    id: str
+    email: str
+    role: str = "user"
+    unit_id: str = DEFAULT_UNIT_ID
+    token_version: int = 0
+
+def create_user_token(user_doc: dict) -> str:
+    return create_access_token(data={
+        "sub": user_doc["email"],
+        "uid": user_doc["id"],
+        "role": user_doc.get("role", "user"),
+        "unit": user_doc.get("unit_id", DEFAULT_UNIT_ID),
+        "ver": user_doc.get("token_version", 0),
+    })
+
+# Token revocation cache: user id -> current token_version (None once the
+# user is deleted). Local writes update it immediately; other workers pick
+# changes up on the next refresh, so a revoked token lives at most
+# TOKEN_VERSION_REFRESH_SECONDS there. Versions only go up: a token older
+# than the cache is revoked, one newer than it was issued after the last
+# refresh and is checked against Mongo instead.
+TOKEN_VERSION_REFRESH_SECONDS = float(os.environ.get("TOKEN_VERSION_REFRESH_SECONDS", "30"))
+token_versions = {}
+background_tasks = []
+
+async def current_token_version(user_id: str, refresh: bool = False) -> Optional[int]:
+    if user_id in token_versions and not refresh:
+        return token_versions[user_id]
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "token_version": 1})
+    version = user.get("token_version", 0) if user is not None else None
+    token_versions[user_id] = version
+    return version
+
+async def refresh_token_versions():
+    users = await db.users.find({}, {"_id": 0, "id": 1, "token_version": 1}).to_list(None)
+    fresh = {user["id"]: user.get("token_version", 0) for user in users}
+    token_versions.clear()
+    token_versions.update(fresh)
+
+async def token_version_refresher():
+    while True:
+        await asyncio.sleep(TOKEN_VERSION_REFRESH_SECONDS)
+        try:
+            await refresh_token_versions()
+        except Exception as e:
+            logger.error(f"Error refreshing token versions: {e}")
+
+@traced("auth.token")
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenClaims:
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -162,10 +973,35 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"email": email}, {"_id": 0, "password": 0})
+    user_id = payload.get("uid")
+    if user_id is None:
+        # Token issued before claims were added: resolve it from the database
+        user = await db.users.find_one(
+            {"email": email}, {"_id": 0, "id": 1, "email": 1, "role": 1, "unit_id": 1, "token_version": 1})
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        if user.get("token_version", 0) > 0:
+            raise HTTPException(status_code=401, detail="Token revoked")
+        return TokenClaims(**user)
+    
+    token_version = payload.get("ver", 0)
+    version = await current_token_version(user_id)
+    if version is None or token_version > version:
+        # Possibly written by another worker since our last refresh
+        version = await current_token_version(user_id, refresh=True)
+    if version is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    if token_version != version:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    
+    return TokenClaims(id=user_id, email=email, role=payload.get("role", "user"),
+                       unit_id=payload.get("unit", DEFAULT_UNIT_ID), token_version=version)
+
+async def load_user(user_id: str) -> User:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
@@ -174,17 +1010,1133 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     return User(**user)
 
+@traced("auth.user")
+async def get_current_user(claims: TokenClaims = Depends(get_token_claims)) -> User:
+    return await load_user(claims.id)
+
+async def get_admin_claims(claims: TokenClaims = Depends(get_token_claims)) -> TokenClaims:
+    """Admin check from the token alone, without reading the user"""
+    if claims.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return claims
+
+async def get_fleet_admin_claims(claims: TokenClaims = Depends(get_admin_claims)) -> TokenClaims:
+    """Admins of the default unit, for routes that span every unit"""
+    if claims.unit_id != DEFAULT_UNIT_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return claims
+
 async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
-# Seed admin user and default settings
+# Optimistic concurrency: documents carry a `version` that every edit bumps.
+# Clients send the version they edited in If-Match; a stale one gets 409.
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a document version")
+
+async def versioned_update(collection, query: dict, update: dict, if_match: Optional[str],
+                           not_found: str, projection: Optional[dict] = None) -> dict:
+    """Apply `update` and return the new document in one round trip.
+
+    An empty update just reads the document. 404 if it does not exist,
+    409 if it exists at a different version than If-Match.
+    """
+    expected = parse_if_match(if_match)
+    guarded = dict(query)
+    if expected is not None:
+        # Documents written before versioning have no field; treat them as 0
+        guarded["version"] = {"$in": [0, None]} if expected == 0 else expected
+    projection = projection or {"_id": 0}
+    
+    if update:
+        update.setdefault("$inc", {})["version"] = 1
+        doc = await collection.find_one_and_update(
+            guarded, update, projection=projection, return_document=ReturnDocument.AFTER)
+    else:
+        doc = await collection.find_one(guarded, projection)
+    
+    if doc is None:
+        if expected is not None and await collection.count_documents(query, limit=1):
+            raise HTTPException(status_code=409, detail="Document was changed by someone else, reload and try again")
+        raise HTTPException(status_code=404, detail=not_found)
+    return doc
+
+def version_etag(doc: dict) -> str:
+    return f'"{doc.get("version", 0)}"'
+
+# Changing any of these invalidates the tokens already issued to the user
+TOKEN_FIELDS = ("email", "password", "role")
+
+def token_update(update_data: dict) -> dict:
+    """Update document for a user, bumping token_version when a TOKEN_FIELD changes"""
+    if not update_data:
+        return {}
+    update = {"$set": update_data}
+    if any(field in update_data for field in TOKEN_FIELDS):
+        update["$inc"] = {"token_version": 1}
+    return update
+
+# Login rate limiting
+# Token buckets refilled at RATE per minute up to BURST; an attempt costs one
+# token from both the email and the client IP bucket. The IP limit is looser
+# because clients behind one NAT or proxy share an address.
+#
+# Behind a reverse proxy (Render's router, nginx) the peer address is the
+# proxy's, so every client would share one IP bucket. List the proxies in
+# TRUSTED_PROXIES (addresses or CIDRs, e.g. "10.0.0.0/8") and the client
+# address is read from X-Forwarded-For instead. Running uvicorn with
+# --proxy-headers --forwarded-allow-ips=... has the same effect for
+# request.client; leave TRUSTED_PROXIES empty in that case.
+LOGIN_EMAIL_RATE_PER_MINUTE = float(os.environ.get("LOGIN_EMAIL_RATE_PER_MINUTE", "5"))
+LOGIN_EMAIL_BURST = float(os.environ.get("LOGIN_EMAIL_BURST", "5"))
+LOGIN_IP_RATE_PER_MINUTE = float(os.environ.get("LOGIN_IP_RATE_PER_MINUTE", "60"))
+LOGIN_IP_BURST = float(os.environ.get("LOGIN_IP_BURST", "20"))
+LOGIN_LIMITER_BACKEND = os.environ.get("LOGIN_LIMITER_BACKEND", "memory")  # "memory" or "mongo"
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.environ.get("TRUSTED_PROXIES", "").split(",") if item.strip()
+]
+
+login_rate_limited = Counter(
+    "login_rate_limited_total", "Login attempts rejected by the rate limiter", ("scope",))
+login_limiter_buckets = Gauge(
+    "login_limiter_buckets", "Token buckets currently tracked by the login limiter", ("scope",))
+
+class MemoryTokenBuckets:
+    """Per-process buckets; enough for a single worker"""
+    def __init__(self, scope: str, rate_per_minute: float, burst: float, max_keys: int = 100000):
+        self.scope = scope
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, updated), least recently used first
+
+    async def take(self, key: str) -> float:
+        """Spend a token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+        self.buckets.move_to_end(key)
+        self.prune(now)
+        if allowed:
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def prune(self, now: float):
+        """Forget buckets that have refilled completely, then the least
+        recently used ones beyond max_keys"""
+        refill = self.burst / self.rate
+        while self.buckets:
+            oldest = next(iter(self.buckets.values()))
+            if len(self.buckets) <= self.max_keys and now - oldest[1] < refill:
+                break
+            self.buckets.popitem(last=False)
+
+    async def occupancy(self) -> int:
+        return len(self.buckets)
+
+class MongoTokenBuckets:
+    """Buckets shared by every worker, updated atomically with one
+    find_one_and_update per attempt using the server clock ($$NOW)"""
+    def __init__(self, scope: str, rate_per_minute: float, burst: float):
+        self.scope = scope
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.collection = db.login_buckets
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            "updated_at", expireAfterSeconds=int(self.burst / self.rate) + 60)
+
+    async def take(self, key: str) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [self.burst, {"$add": [{"$ifNull": ["$tokens", self.burst]}, {"$multiply": [elapsed, self.rate]}]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{self.scope}:{key}"},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return 0.0
+        return (1 - doc["tokens"]) / self.rate
+
+    async def occupancy(self) -> int:
+        return await self.collection.count_documents({"_id": {"$regex": f"^{self.scope}:"}})
+
+def make_token_buckets(scope: str, rate_per_minute: float, burst: float):
+    if LOGIN_LIMITER_BACKEND == "mongo":
+        return MongoTokenBuckets(scope, rate_per_minute, burst)
+    return MemoryTokenBuckets(scope, rate_per_minute, burst)
+
+login_limiters = {
+    "email": make_token_buckets("email", LOGIN_EMAIL_RATE_PER_MINUTE, LOGIN_EMAIL_BURST),
+    "ip": make_token_buckets("ip", LOGIN_IP_RATE_PER_MINUTE, LOGIN_IP_BURST),
+}
+
+def client_address(request: Request) -> str:
+    """The client's IP, taken from X-Forwarded-For when the peer is a trusted proxy"""
+    peer = request.client.host if request.client else "-"
+    if not TRUSTED_PROXIES:
+        return peer
+    
+    def trusted(address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in TRUSTED_PROXIES)
+    
+    if not trusted(peer):
+        return peer
+    # Each proxy appends the address it received from; walk back past our own
+    forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+    for address in reversed(forwarded):
+        if not trusted(address):
+            return address
+    return forwarded[0] if forwarded else peer
+
+async def check_login_rate(email: str, client_ip: str):
+    """Raise 429 before any database or bcrypt work if either bucket is empty.
+
+    The IP bucket goes first so an address that is already throttled can't
+    drain the email bucket of the account it is guessing at."""
+    for scope, key in (("ip", client_ip), ("email", email.lower())):
+        wait = await login_limiters[scope].take(key)
+        if wait > 0:
+            login_rate_limited.inc((scope,))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+async def collect_login_limiter_metrics():
+    for scope, limiter in login_limiters.items():
+        login_limiter_buckets.set((scope,), await limiter.occupancy())
+
+metrics_collectors.append(collect_login_limiter_metrics)
+
+# Response compression
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+class CompressionMiddleware:
+    """Compress JSON/text responses above COMPRESS_MIN_SIZE.
+
+    Responses that already carry a Content-Encoding (the precompressed
+    cached payloads below) are passed through untouched.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        passthrough = False
+        chunks = []
+        
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress_body(body, encoding)
+                headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+        
+        await self.app(scope, receive, send_compressed)
+
+class CachedPayload:
+    """Serialized response body plus its compressed variants, built on first use"""
+    __slots__ = ("body", "etag", "encoded")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = 'W/"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        self.encoded = {}
+
+    def encode(self, encoding: Optional[str]) -> bytes:
+        if encoding is None or len(self.body) < COMPRESS_MIN_SIZE:
+            return self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compress_body(self.body, encoding)
+        return data
+
+# Caching
+# Read-through cache with a TTL and LRU bound per namespace. Entries record
+# the versions of their tags when loaded; invalidate_tags() bumps a tag so
+# every entry carrying it is a miss from then on, including entries loaded
+# while the write was in flight. The sqlite store shares entries and tag
+# versions between workers on one host.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH", "/tmp/military-unit-cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "2000"))
+CACHE_TTLS = {
+    "payloads": 300,
+    "range_payloads": 300,
+    "groups": 60,
+    "user_groups": 60,
+    "user_duties": 60,
+    "users": 60,
+    "calendars": 3600,
+    "feed_tokens": 300,
+}
+for _item in filter(None, os.environ.get("CACHE_TTLS", "").split(",")):  # e.g. "groups=30,users=120"
+    _name, _, _ttl = _item.partition("=")
+    CACHE_TTLS[_name.strip()] = float(_ttl)
+
+cache_requests = Counter("cache_requests_total", "Cache lookups by namespace and result", ("namespace", "result"))
+singleflight_calls = Counter(
+    "singleflight_calls_total", "Loads that ran (leader) or awaited an identical in-flight load (collapsed)",
+    ("key", "result"))
+
+class SingleFlight:
+    """Coalesce identical concurrent loads: while a load for a key is running,
+    later callers await its result instead of issuing their own query.
+
+    The load runs in its own task so a disconnecting leader doesn't cancel
+    it for everyone else. `label` names the metric series: a fixed name, never
+    the key, which can carry unit ids, dates and other request values."""
+    def __init__(self):
+        self.inflight = {}
+
+    async def run(self, key: str, loader, label: str):
+        task = self.inflight.get(key)
+        if task is not None:
+            singleflight_calls.inc((label, "collapsed"))
+            return await asyncio.shield(task)
+        
+        singleflight_calls.inc((label, "leader"))
+        task = asyncio.ensure_future(loader())
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+single_flight = SingleFlight()
+
+class MemoryCacheStore:
+    """Per-process LRU dictionaries"""
+    shared = False
+
+    def __init__(self):
+        self.namespaces = {}
+        self.tags = {}
+
+    def get(self, namespace: str, key: str):
+        entries = self.namespaces.get(namespace)
+        if entries is None or key not in entries:
+            return None
+        entries.move_to_end(key)
+        return entries[key]
+
+    def set(self, namespace: str, key: str, entry: tuple, max_entries: int):
+        entries = self.namespaces.setdefault(namespace, OrderedDict())
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def tag_versions(self, tags: tuple) -> tuple:
+        return tuple(self.tags.get(tag, 0) for tag in tags)
+
+    def bump_tags(self, tags: tuple):
+        for tag in tags:
+            self.tags[tag] = self.tags.get(tag, 0) + 1
+
+    def size(self, namespace: str) -> int:
+        return len(self.namespaces.get(namespace, ()))
+
+class SqliteCacheStore:
+    """Entries and tag versions in a local sqlite file shared by all workers"""
+    shared = True
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (namespace TEXT, key TEXT, value BLOB, used REAL, "
+            "PRIMARY KEY (namespace, key))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, version INTEGER)")
+
+    def get(self, namespace: str, key: str):
+        row = self.conn.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE entries SET used = ? WHERE namespace = ? AND key = ?", (time.time(), namespace, key))
+        return pickle.loads(row[0])
+
+    def set(self, namespace: str, key: str, entry: tuple, max_entries: int):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+            (namespace, key, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), time.time()))
+        self.conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND key IN (SELECT key FROM entries WHERE namespace = ? "
+            "ORDER BY used DESC LIMIT -1 OFFSET ?)", (namespace, namespace, max_entries))
+
+    def tag_versions(self, tags: tuple) -> tuple:
+        if not tags:
+            return ()
+        rows = dict(self.conn.execute(
+            f"SELECT tag, version FROM tags WHERE tag IN ({','.join('?' * len(tags))})", tags).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def bump_tags(self, tags: tuple):
+        self.conn.executemany(
+            "INSERT INTO tags VALUES (?, 1) ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+            [(tag,) for tag in tags])
+
+    def size(self, namespace: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+cache_store = SqliteCacheStore(CACHE_SQLITE_PATH) if CACHE_BACKEND == "sqlite" else MemoryCacheStore()
+
+class Cache:
+    """One namespace of the read-through cache"""
+    def __init__(self, namespace: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.ttl = CACHE_TTLS.get(namespace, 60)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        caches[namespace] = self
+
+    def lookup(self, key: str) -> Optional[tuple]:
+        """(value, tag versions it was validated against) on a hit"""
+        entry = cache_store.get(self.namespace, key)
+        if entry is not None:
+            value, expires_at, tags, versions = entry
+            if expires_at > time.time() and cache_store.tag_versions(tags) == versions:
+                self.hits += 1
+                cache_requests.inc((self.namespace, "hit"))
+                return value, versions
+        self.misses += 1
+        cache_requests.inc((self.namespace, "miss"))
+        return None
+
+    def get(self, key: str):
+        hit = self.lookup(key)
+        return hit[0] if hit is not None else None
+
+    def put(self, key: str, value, tags: tuple = (), versions: Optional[tuple] = None):
+        if versions is None:
+            versions = cache_store.tag_versions(tags)
+        entry = (value, time.time() + self.ttl, tags, versions)
+        cache_store.set(self.namespace, key, entry, self.max_entries)
+
+    async def load_entry(self, key: str, loader, tags: tuple = ()) -> tuple:
+        """(value, tag versions) from the cache or `loader()`; pass the
+        versions back to put() when storing a derived copy of the value"""
+        hit = self.lookup(key)
+        if hit is None:
+            async def load():
+                # Snapshot tag versions before loading so a concurrent write wins
+                versions = cache_store.tag_versions(tags)
+                loaded = await loader()
+                self.put(key, loaded, tags, versions)
+                return loaded, versions
+            
+            hit = await single_flight.run(f"{self.namespace}:{key}", load, self.namespace)
+        return hit
+
+    async def get_or_load(self, key: str, loader, tags: tuple = ()):
+        return (await self.load_entry(key, loader, tags))[0]
+
+caches = {}
+
+def invalidate_tags(*tags: str):
+    cache_store.bump_tags(tags)
+
+def invalidate_payloads(*keys: str):
+    invalidate_tags(*keys)
+
+def invalidate_duties(unit_id: Optional[str], *user_ids: str):
+    """The unit's roster payloads (every unit's when None) plus each affected user's duty list"""
+    invalidate_tags(scoped(unit_id, "duties") if unit_id else "duties", *(f"duties:{user_id}" for user_id in user_ids))
+
+# Fixed per-unit payloads (settings, news, the full roster) stay apart from
+# those keyed by a requested range, month or group, so varying ranges can't
+# evict the hot ones.
+payload_cache = Cache("payloads", max_entries=100)
+range_payload_cache = Cache("range_payloads", max_entries=500)
+groups_cache = Cache("groups", max_entries=100)
+user_groups_cache = Cache("user_groups")
+user_duties_cache = Cache("user_duties")
+users_cache = Cache("users", max_entries=100)
+calendar_cache = Cache("calendars")
+feed_tokens_cache = Cache("feed_tokens")
+
+async def cached_json_response(request: Request, key: str, loader, tags: tuple = ()) -> Response:
+    """Serve `loader()` from the payload cache, negotiating the encoding.
+
+    `key` doubles as the invalidation tag, see invalidate_payloads(); `tags`
+    adds more, e.g. the unscoped name that jobs spanning all units bump.
+    """
+    async def serialize():
+        data = jsonable_encoder(await loader())
+        return CachedPayload(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    
+    return await cached_payload_response(request, payload_cache, key, serialize, (key, *tags), "application/json")
+
+async def cached_payload_response(request: Request, cache: Cache, key: str, render, tags: tuple,
+                                  media_type: str) -> Response:
+    """Serve the CachedPayload built by `render()` with ETag/304 and a
+    precompressed body for the negotiated encoding"""
+    entry, versions = await cache.load_entry(key, render, tags)
+    
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    known_encodings = len(entry.encoded)
+    body = entry.encode(encoding)
+    if body is not entry.body:
+        headers["Content-Encoding"] = encoding
+    if cache_store.shared and len(entry.encoded) != known_encodings:
+        # Store the new variant so other workers don't compress it again. Keep
+        # the versions it was validated against: a write since then must
+        # still turn it into a miss.
+        cache.put(key, entry, tags, versions)
+    return Response(body, media_type=media_type, headers=headers)
+
+# Idempotency keys
+# POST endpoints that clients retry accept an Idempotency-Key header. The
+# first request claims the key with a pending record; repeats replay the
+# stored status and body, or wait for the original if it is still running
+# (in this worker through single_flight, in another by polling the record).
+# The worker running the request renews the record's claimed_at; a claim
+# not renewed for IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS belongs to a dead worker
+# and the next retry takes it over.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS = float(os.environ.get("IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", "60"))
+
+def request_fingerprint(payload) -> str:
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+def idempotency_claim_expired(record: dict) -> bool:
+    claimed_at = utc(record.get("claimed_at") or record["created_at"])
+    return claimed_at < datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS)
+
+async def claim_idempotency_key(record_id: str, fingerprint: str) -> Optional[str]:
+    """A claim token if this request should run: the key is new, or its
+    pending claim was abandoned"""
+    now = datetime.now(timezone.utc)
+    claim = str(uuid.uuid4())
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "state": "pending",
+            "claim": claim,
+            "claimed_at": now,
+            "created_at": now,
+        })
+        return claim
+    except DuplicateKeyError:
+        pass
+    
+    expired = now - timedelta(seconds=IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS)
+    result = await db.idempotency_keys.update_one(
+        {"_id": record_id, "fingerprint": fingerprint, "state": "pending",
+         "$or": [{"claimed_at": {"$lt": expired}}, {"claimed_at": None, "created_at": {"$lt": expired}}]},
+        {"$set": {"claim": claim, "claimed_at": now}})
+    return claim if result.modified_count else None
+
+async def renew_idempotency_claim(record_id: str, claim: str):
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS / 3)
+        await db.idempotency_keys.update_one(
+            {"_id": record_id, "claim": claim}, {"$set": {"claimed_at": datetime.now(timezone.utc)}})
+
+async def replay_idempotent(record_id: str, fingerprint: str):
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = await db.idempotency_keys.find_one({"_id": record_id})
+        if record is None:
+            # The original failed and released the key; let the client retry
+            raise HTTPException(status_code=409, detail="Original request failed, retry it",
+                                headers={"Retry-After": "1"})
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if record["state"] == "done":
+            return JSONResponse(record["body"], status_code=record["status"], headers={"Idempotent-Replayed": "true"})
+        if idempotency_claim_expired(record):
+            # The worker running the original died; the retry takes it over
+            raise HTTPException(status_code=409, detail="Original request was abandoned, retry it",
+                                headers={"Retry-After": "1"})
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Original request is still in progress",
+                                headers={"Retry-After": "5"})
+        await asyncio.sleep(0.25)
+
+async def execute_idempotent(record_id: str, fingerprint: str, action):
+    claim = await claim_idempotency_key(record_id, fingerprint)
+    if claim is None:
+        return await replay_idempotent(record_id, fingerprint)
+    
+    ours = {"_id": record_id, "claim": claim}
+    renewer = asyncio.create_task(renew_idempotency_claim(record_id, claim))
+    try:
+        try:
+            result = await action()
+        finally:
+            renewer.cancel()
+    except HTTPException as e:
+        await db.idempotency_keys.update_one(
+            ours, {"$set": {"state": "done", "status": e.status_code, "body": {"detail": e.detail}}})
+        raise
+    except BaseException:
+        # Unexpected failure: release the key so a retry runs again
+        await db.idempotency_keys.delete_one(ours)
+        raise
+    
+    await db.idempotency_keys.update_one(
+        ours, {"$set": {"state": "done", "status": 200, "body": jsonable_encoder(result)}})
+    return result
+
+async def run_idempotent(idempotency_key: Optional[str], scope: str, principal: str, payload, action):
+    """Run `action()` once per (scope, principal, Idempotency-Key)"""
+    if not idempotency_key:
+        return await action()
+    record_id = f"{scope}:{principal}:{idempotency_key}"
+    fingerprint = request_fingerprint(payload)
+    return await single_flight.run(
+        f"idempotency:{record_id}:{fingerprint}",
+        lambda: execute_idempotent(record_id, fingerprint, action),
+        f"idempotency:{scope}",
+    )
+
+@maintenance_task
+@startup_phase
+async def ensure_idempotency_indexes():
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+
+# Orphan compaction
+# Deleting a user leaves their duties and group memberships behind. The
+# delete enqueues the id and a background worker moves the duties to
+# duties_archive (or drops them when ORPHAN_DUTIES_ARCHIVE is off) and pulls
+# the id from every group. A periodic sweep catches whatever the queue
+# missed: other workers' deletes, restarts, data written before this existed.
+ORPHAN_DUTIES_ARCHIVE = os.environ.get("ORPHAN_DUTIES_ARCHIVE", "true").lower() == "true"
+ORPHAN_SWEEP_SECONDS = float(os.environ.get("ORPHAN_SWEEP_SECONDS", "3600"))
+COMPACTION_BATCH_SIZE = int(os.environ.get("COMPACTION_BATCH_SIZE", "500"))
+compaction_queue = asyncio.Queue()
+orphan_sweeps = {"last": None}
+orphans_compacted = Counter(
+    "orphans_compacted_total", "Dead rows removed after user deletion, by kind and trigger", ("kind", "trigger"))
+
+def enqueue_compaction(*user_ids: str):
+    for user_id in user_ids:
+        compaction_queue.put_nowait(user_id)
+
+async def archive_documents(source, target, query: dict, batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+    """Move matching documents from source to target in batches; returns how many moved"""
+    moved = 0
+    while True:
+        batch = await source.find(query).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return moved
+        archived_at = datetime.now(timezone.utc).isoformat()
+        for doc in batch:
+            doc["archived_at"] = archived_at
+        try:
+            await target.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Same _id already archived by an interrupted run; anything else is real
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        result = await source.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        moved += result.deleted_count
+
+async def compact_orphans(user_ids: List[str], trigger: str) -> dict:
+    """Remove the duties and group memberships of deleted users"""
+    removed = {"users": len(user_ids), "duties": 0, "groups": 0}
+    for start in range(0, len(user_ids), COMPACTION_BATCH_SIZE):
+        batch = user_ids[start:start + COMPACTION_BATCH_SIZE]
+        await roster_remove(await find_duties({"user_id": {"$in": batch}}, limit=None))
+        for duties in await duty_collections():
+            if ORPHAN_DUTIES_ARCHIVE:
+                removed["duties"] += await archive_documents(duties, db.duties_archive, {"user_id": {"$in": batch}})
+            else:
+                result = await duties.delete_many({"user_id": {"$in": batch}})
+                removed["duties"] += result.deleted_count
+        result = await db.groups.update_many(
+            {"member_ids": {"$in": batch}},
+            {"$pull": {"member_ids": {"$in": batch}}, "$inc": {"version": 1}})
+        removed["groups"] += result.modified_count
+    
+    if removed["duties"]:
+        invalidate_duties(None, *user_ids)
+        orphans_compacted.inc(("duties", trigger), removed["duties"])
+    if removed["groups"]:
+        invalidate_tags("groups")
+        orphans_compacted.inc(("groups", trigger), removed["groups"])
+    return removed
+
+async def orphan_compactor():
+    while True:
+        user_ids = {await compaction_queue.get()}
+        while not compaction_queue.empty() and len(user_ids) < COMPACTION_BATCH_SIZE:
+            user_ids.add(compaction_queue.get_nowait())
+        try:
+            await compact_orphans(sorted(user_ids), "delete")
+        except Exception as e:
+            # The next sweep picks these ids up again
+            logger.error(f"Error compacting orphans of {len(user_ids)} deleted users: {e}")
+
+async def sweep_orphans() -> dict:
+    """Find ids referenced by duties or groups that no longer have a user, and compact them"""
+    started = time.perf_counter()
+    # Referenced before live: a user created in between is then never taken for dead
+    referenced = await asyncio.gather(
+        db.groups.distinct("member_ids"), *(duties.distinct("user_id") for duties in await duty_collections()))
+    live_ids = set(await db.users.distinct("id"))
+    orphan_ids = sorted(set().union(*referenced) - live_ids)
+    report = await compact_orphans(orphan_ids, "sweep")
+    report["at"] = datetime.now(timezone.utc).isoformat()
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    orphan_sweeps["last"] = report
+    if orphan_ids:
+        logger.info(
+            f"Orphan sweep: {report['users']} deleted users, {report['duties']} duties "
+            f"{'archived' if ORPHAN_DUTIES_ARCHIVE else 'deleted'}, {report['groups']} groups compacted")
+    return report
+
+async def orphan_sweeper():
+    while True:
+        await asyncio.sleep(ORPHAN_SWEEP_SECONDS)
+        try:
+            async with lease("orphan-sweep") as held:
+                if held:
+                    await sweep_orphans()
+        except Exception as e:
+            logger.error(f"Error sweeping orphans: {e}")
+
+# Notifications
+# Duty and news writes append events to notification_outbox in the same
+# request; nothing is delivered inline. A background dispatcher claims
+# pending events in batches, folds them into one digest per recipient
+# (recipient "*" means every user) and hands the digests to the sender
+# chosen by NOTIFY_SINK. Failed batches are retried with backoff. Without a
+# sink no events are recorded.
+NOTIFY_SINK = os.environ.get("NOTIFY_SINK", "")  # "", "memory", "file" or "webhook"
+NOTIFY_FILE = os.environ.get("NOTIFY_FILE", "notifications.jsonl")
+NOTIFY_WEBHOOK_URL = os.environ.get("NOTIFY_WEBHOOK_URL")
+NOTIFY_BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", "500"))
+NOTIFY_POLL_SECONDS = float(os.environ.get("NOTIFY_POLL_SECONDS", "5"))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_CLAIM_TIMEOUT_SECONDS = float(os.environ.get("NOTIFY_CLAIM_TIMEOUT_SECONDS", "300"))
+NOTIFY_LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+notify_wakeup = asyncio.Event()
+
+notification_events = Counter(
+    "notification_events_total", "Outbox events by kind and outcome", ("kind", "outcome"))
+notifications_sent = Counter("notifications_sent_total", "Digests handed to the notification sender", ("sink",))
+notification_lag = Histogram(
+    "notification_delivery_lag_seconds", "Time from outbox write to delivery", buckets=NOTIFY_LAG_BUCKETS)
+notification_outbox_depth = Gauge("notification_outbox_depth", "Outbox events by state", ("state",))
+
+class MemorySender:
+    """Keeps the most recent digests in memory; for tests and local runs"""
+    name = "memory"
+
+    def __init__(self, max_digests: int = 1000):
+        self.sent = deque(maxlen=max_digests)
+
+    async def send(self, digests: List[dict]):
+        self.sent.extend(digests)
+
+class FileSender:
+    """Appends one JSON line per digest to a local file"""
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send(self, digests: List[dict]):
+        lines = "".join(json.dumps(digest, ensure_ascii=False) + "\n" for digest in digests)
+        await asyncio.to_thread(self.append, lines)
+
+    def append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+class WebhookSender:
+    """POSTs each batch of digests as {"notifications": [...]}"""
+    name = "webhook"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def send(self, digests: List[dict]):
+        async with http_client(timeout=10.0) as client:
+            response = await client.post(self.url, json={"notifications": digests})
+            response.raise_for_status()
+
+def make_notification_sender():
+    if NOTIFY_SINK == "memory":
+        return MemorySender()
+    if NOTIFY_SINK == "file":
+        return FileSender(NOTIFY_FILE)
+    if NOTIFY_SINK == "webhook":
+        return WebhookSender(NOTIFY_WEBHOOK_URL)
+    return None
+
+notification_sender = make_notification_sender()
+
+async def enqueue_notifications(events: List[dict]):
+    """Append {recipient, unit_id, kind, payload} events to the outbox"""
+    if notification_sender is None or not events:
+        return
+    now = datetime.now(timezone.utc)
+    await db.notification_outbox.insert_many([{
+        "recipient": event["recipient"],
+        "unit_id": event["unit_id"],
+        "kind": event["kind"],
+        "payload": event["payload"],
+        "state": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "not_before": now,
+    } for event in events], ordered=False)
+    notify_wakeup.set()
+
+async def claim_notifications() -> List[dict]:
+    """Mark up to NOTIFY_BATCH_SIZE due events as ours and return them"""
+    now = datetime.now(timezone.utc)
+    # A worker that died mid-delivery leaves its claim behind
+    await db.notification_outbox.update_many(
+        {"state": "sending", "claimed_at": {"$lt": now - timedelta(seconds=NOTIFY_CLAIM_TIMEOUT_SECONDS)}},
+        {"$set": {"state": "pending"}})
+    due = await db.notification_outbox.find(
+        {"state": "pending", "not_before": {"$lte": now}}, {"_id": 1}
+    ).sort("not_before", 1).limit(NOTIFY_BATCH_SIZE).to_list(NOTIFY_BATCH_SIZE)
+    if not due:
+        return []
+    
+    claim = str(uuid.uuid4())
+    await db.notification_outbox.update_many(
+        {"_id": {"$in": [event["_id"] for event in due]}, "state": "pending"},
+        {"$set": {"state": "sending", "claim": claim, "claimed_at": now}})
+    return await db.notification_outbox.find({"claim": claim, "state": "sending"}).to_list(None)
+
+def utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def build_digests(events: List[dict]) -> List[dict]:
+    """One digest per recipient with all of their events, oldest first.
+
+    Broadcasts ("*") go to every user of the event's unit.
+    """
+    broadcast = {}
+    for event in events:
+        if event["recipient"] == "*":
+            broadcast.setdefault(event.get("unit_id", DEFAULT_UNIT_ID), []).append(event)
+    direct = [event for event in events if event["recipient"] != "*"]
+    user_query = {"id": {"$in": list({event["recipient"] for event in direct})}}
+    if broadcast:
+        user_query = {"$or": [user_query, {"unit_id": {"$in": list(broadcast)}}]}
+    users = await db.users.find(
+        user_query, {"_id": 0, "id": 1, "unit_id": 1, "email": 1, "full_name": 1}).to_list(None)
+    
+    by_recipient = {user["id"]: list(broadcast.get(user.get("unit_id"), [])) for user in users}
+    for event in direct:
+        if event["recipient"] in by_recipient:  # skip users deleted since
+            by_recipient[event["recipient"]].append(event)
+    
+    digests = []
+    for user in users:
+        user_events = sorted(by_recipient[user["id"]], key=lambda event: event["created_at"])
+        if user_events:
+            digests.append({
+                "recipient": user["id"],
+                "email": user["email"],
+                "full_name": user["full_name"],
+                "events": [{
+                    "kind": event["kind"],
+                    "payload": event["payload"],
+                    "created_at": utc(event["created_at"]).isoformat(),
+                } for event in user_events],
+            })
+    return digests
+
+async def dispatch_notifications() -> int:
+    """Deliver one claimed batch; returns how many events it held"""
+    events = await claim_notifications()
+    if not events:
+        return 0
+    
+    try:
+        digests = await build_digests(events)
+        if digests:
+            await notification_sender.send(digests)
+    except Exception as e:
+        logger.error(f"Error delivering {len(events)} notifications: {e}")
+        now = datetime.now(timezone.utc)
+        retries = []
+        for event in events:
+            attempts = event["attempts"] + 1
+            if attempts >= NOTIFY_MAX_ATTEMPTS:
+                notification_events.inc((event["kind"], "failed"))
+                update = {"$set": {"state": "failed", "attempts": attempts, "error": str(e)}}
+            else:
+                backoff = timedelta(seconds=NOTIFY_POLL_SECONDS * 2 ** attempts)
+                update = {"$set": {"state": "pending", "attempts": attempts, "not_before": now + backoff}}
+            retries.append(UpdateOne({"_id": event["_id"]}, update))
+        await db.notification_outbox.bulk_write(retries, ordered=False)
+        return len(events)
+    
+    await db.notification_outbox.delete_many({"_id": {"$in": [event["_id"] for event in events]}})
+    now = datetime.now(timezone.utc)
+    for event in events:
+        notification_events.inc((event["kind"], "delivered"))
+        notification_lag.observe((), (now - utc(event["created_at"])).total_seconds())
+    notifications_sent.inc((notification_sender.name,), len(digests))
+    return len(events)
+
+async def notification_dispatcher():
+    while True:
+        notify_wakeup.clear()
+        try:
+            handled = await dispatch_notifications()
+        except Exception as e:
+            logger.error(f"Error dispatching notifications: {e}")
+            handled = 0
+        if handled < NOTIFY_BATCH_SIZE:
+            # Caught up: sleep until the next write or poll
+            try:
+                await asyncio.wait_for(notify_wakeup.wait(), NOTIFY_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+@maintenance_task(config=("NOTIFY_SINK",))
+@startup_phase
+async def ensure_notification_indexes():
+    if notification_sender is not None:
+        await asyncio.gather(
+            db.notification_outbox.create_index([("state", 1), ("not_before", 1)]),
+            db.notification_outbox.create_index("claim", sparse=True),
+        )
+
+async def collect_notification_metrics():
+    if notification_sender is None:
+        return
+    counts = {"pending": 0, "sending": 0, "failed": 0}
+    async for row in db.notification_outbox.aggregate([{"$group": {"_id": "$state", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    for state, count in counts.items():
+        notification_outbox_depth.set((state,), count)
+
+metrics_collectors.append(collect_notification_metrics)
+
+# Audit log
+# Admin mutations are recorded in audit_log without a round trip in the
+# request: audit() appends to an in-process buffer, and audit_writer flushes
+# it with insert_many once AUDIT_BATCH_SIZE entries are waiting or every
+# AUDIT_FLUSH_SECONDS, and a last time on shutdown. The buffer holds at most
+# AUDIT_BUFFER_SIZE entries; if Mongo falls that far behind, the oldest
+# entries are dropped (audit_entries_total{outcome="dropped"}) rather than
+# blocking admin calls or growing without bound.
+AUDIT_BUFFER_SIZE = int(os.environ.get("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_SECONDS = float(os.environ.get("AUDIT_FLUSH_SECONDS", "2"))
+AUDIT_PAGE_SIZE = 100
+audit_buffer = deque()
+audit_wakeup = asyncio.Event()
+audit_entries = Counter("audit_entries_total", "Audit entries by outcome", ("outcome",))
+
+def audit(actor: TokenClaims, action: str, target_id: Optional[str] = None, details: Optional[dict] = None):
+    """Queue an audit entry, e.g. audit(current_user, "news.delete", news_id)"""
+    if len(audit_buffer) >= AUDIT_BUFFER_SIZE:
+        audit_buffer.popleft()
+        audit_entries.inc(("dropped",))
+    audit_buffer.append({
+        "_id": str(uuid.uuid4()),
+        "unit_id": actor.unit_id,
+        "actor_id": actor.id,
+        "actor_email": actor.email,
+        "action": action,
+        "target_id": target_id,
+        "details": details or {},
+        "at": datetime.now(timezone.utc),
+    })
+    audit_entries.inc(("buffered",))
+    if len(audit_buffer) >= AUDIT_BATCH_SIZE:
+        audit_wakeup.set()
+
+async def flush_audit() -> int:
+    """Write everything buffered; returns how many entries were written"""
+    written = 0
+    while audit_buffer:
+        batch = [audit_buffer.popleft() for _ in range(min(AUDIT_BATCH_SIZE, len(audit_buffer)))]
+        try:
+            await db.audit_log.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Entries carry their _id, so a batch retried after a cancelled
+            # write only fails on the entries that already made it
+            failed = [error for error in e.details["writeErrors"] if error["code"] != 11000]
+            for error in failed:
+                logger.error(f"Dropping audit entry {batch[error['index']]['_id']}: {error.get('errmsg')}")
+            audit_entries.inc(("dropped",), len(failed))
+            audit_entries.inc(("written",), len(batch) - len(failed))
+            written += len(batch) - len(failed)
+            continue
+        except BaseException:
+            # Put the batch back for the next flush, then trim to the bound
+            audit_buffer.extendleft(reversed(batch))
+            while len(audit_buffer) > AUDIT_BUFFER_SIZE:
+                audit_buffer.popleft()
+                audit_entries.inc(("dropped",))
+            raise
+        audit_entries.inc(("written",), len(batch))
+        written += len(batch)
+    return written
+
+async def audit_writer():
+    while True:
+        try:
+            await asyncio.wait_for(audit_wakeup.wait(), AUDIT_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        audit_wakeup.clear()
+        try:
+            await flush_audit()
+        except Exception as e:
+            logger.error(f"Error writing {len(audit_buffer)} audit entries: {e}")
+
+@maintenance_task
+@startup_phase
+async def ensure_audit_indexes():
+    await asyncio.gather(
+        db.audit_log.create_index([("unit_id", 1), ("at", -1)]),
+        db.audit_log.create_index([("unit_id", 1), ("actor_id", 1), ("at", -1)]),
+        db.audit_log.create_index([("unit_id", 1), ("action", 1), ("at", -1)]),
+        db.audit_log.create_index([("unit_id", 1), ("target_id", 1), ("at", -1)]),
+    )
+
+@maintenance_task
+@startup_phase
+async def ensure_feed_token_index():
+    await db.users.create_index("feed_token_hash", unique=True, sparse=True)
+
+@app.on_event("startup")
+@startup_phase
+async def capture_event_loop():
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+
+@maintenance_task(config=("LOGIN_LIMITER_BACKEND",))
+@startup_phase
+async def ensure_limiter_indexes():
+    if LOGIN_LIMITER_BACKEND == "mongo":
+        await asyncio.gather(*(limiter.ensure_indexes() for limiter in login_limiters.values()))
+
 @app.on_event("startup")
+@startup_phase
+async def start_background_tasks():
+    background_tasks.append(asyncio.create_task(token_version_refresher()))
+    background_tasks.append(asyncio.create_task(orphan_compactor()))
+    background_tasks.append(asyncio.create_task(orphan_sweeper()))
+    background_tasks.append(asyncio.create_task(news_archiver()))
+    background_tasks.append(asyncio.create_task(duty_partitioner()))
+    if notification_sender is not None:
+        background_tasks.append(asyncio.create_task(notification_dispatcher()))
+    background_tasks.append(asyncio.create_task(audit_writer()))
+    background_tasks.append(asyncio.create_task(news_poller()))
+    if span_exporter is not None:
+        background_tasks.append(asyncio.create_task(trace_writer()))
+
+# Seed admin user and default settings; after assign_default_unit so legacy
+# settings already count as the default unit's
+@maintenance_task(after=("assign_default_unit",), config=("DEFAULT_UNIT_ID",))
+@startup_phase
 async def seed_admin():
     admin_email = "sheremet.b.s@gmail.com"
-    existing_admin = await db.users.find_one({"email": admin_email})
+    existing_admin, existing_settings = await asyncio.gather(
+        db.users.find_one({"email": admin_email}, {"_id": 1}),
+        db.settings.find_one({"unit_id": DEFAULT_UNIT_ID}, {"_id": 1}),
+    )
     
+    inserts = []
     if not existing_admin:
         admin_user = User(
             email=admin_email,
@@ -196,21 +2148,24 @@ async def seed_admin():
         admin_doc['created_at'] = admin_doc['created_at'].isoformat()
         admin_doc['password'] = get_password_hash("8662196415q")
         
-        await db.users.insert_one(admin_doc)
+        inserts.append(db.users.insert_one(admin_doc))
         logger.info(f"Admin user created: {admin_email}")
     
     # Seed default settings
-    existing_settings = await db.settings.find_one({"id": "military_unit_settings"})
     if not existing_settings:
         default_settings = Settings()
         settings_doc = default_settings.model_dump()
         settings_doc['updated_at'] = settings_doc['updated_at'].isoformat()
-        await db.settings.insert_one(settings_doc)
+        inserts.append(db.settings.insert_one(settings_doc))
         logger.info("Default settings created")
+    
+    await asyncio.gather(*inserts)
 
 # Auth Routes
 @api_router.post("/auth/register", response_model=User)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, unit_id: str = Depends(get_request_unit)):
+    if unit_id != DEFAULT_UNIT_ID and not await db.settings.count_documents({"unit_id": unit_id}, limit=1):
+        raise HTTPException(status_code=404, detail="Unit not found")
     existing_user = await db.users.find_one({"email": user_data.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -220,6 +2175,7 @@ async def register(user_data: UserCreate):
         full_name=user_data.full_name,
         rank=user_data.rank,
         role="user",
+        unit_id=unit_id,
         verified=True  # Auto-verify for now
     )
     
@@ -227,11 +2183,18 @@ async def register(user_data: UserCreate):
     user_doc['created_at'] = user_doc['created_at'].isoformat()
     user_doc['password'] = get_password_hash(user_data.password)
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    token_versions[user.id] = 0
+    invalidate_tags(scoped(unit_id, "users"))
     return user
 
 @api_router.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
+    await check_login_rate(credentials.email, client_address(request))
+    
     user_doc = await db.users.find_one({"email": credentials.email})
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -239,7 +2202,7 @@ async def login(credentials: UserLogin):
     if not verify_password(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    access_token = create_access_token(data={"sub": credentials.email})
+    access_token = create_user_token(user_doc)
     
     # Convert to User model
     user_doc.pop('password')
@@ -255,7 +2218,8 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @api_router.put("/auth/profile", response_model=User)
-async def update_profile(user_data: UserUpdate, current_user: User = Depends(get_current_user)):
+async def update_profile(user_data: UserUpdate, response: Response, if_match: Optional[str] = Header(None),
+                         current_user: TokenClaims = Depends(get_token_claims)):
     update_data = {}
     
     if user_data.full_name:
@@ -271,19 +2235,92 @@ async def update_profile(user_data: UserUpdate, current_user: User = Depends(get
     if user_data.password:
         update_data['password'] = get_password_hash(user_data.password)
     
+    try:
+        updated_user = await versioned_update(
+            db.users, {"id": current_user.id}, token_update(update_data), if_match,
+            "User not found", {"_id": 0, "password": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already in use")
     if update_data:
-        await db.users.update_one({"id": current_user.id}, {"$set": update_data})
-    
-    updated_user = await db.users.find_one({"id": current_user.id}, {"_id": 0, "password": 0})
+        invalidate_tags(scoped(current_user.unit_id, "users"))
+    if 'full_name' in update_data:
+        await rename_duty_user(current_user.unit_id, current_user.id, update_data['full_name'])
+    response.headers["ETag"] = version_etag(updated_user)
+    if updated_user.get('token_version', 0) != current_user.token_version:
+        # The caller's own token was just revoked; hand them a fresh one
+        token_versions[current_user.id] = updated_user.get('token_version', 0)
+        response.headers["X-Access-Token"] = create_user_token(updated_user)
     if isinstance(updated_user['created_at'], str):
         updated_user['created_at'] = datetime.fromisoformat(updated_user['created_at'])
     
     return User(**updated_user)
 
+# News tiering
+# The news collection is the hot tier: local announcements, pinned items and
+# external items younger than NEWS_HOT_DAYS. Older external items are moved
+# to news_archive in scheduled batches. Every page merges both tiers newest
+# first (the default one from the payload cache), so moving an item never
+# changes where it appears.
+NEWS_HOT_DAYS = float(os.environ.get("NEWS_HOT_DAYS", "30"))
+NEWS_ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("NEWS_ARCHIVE_INTERVAL_SECONDS", "3600"))
+NEWS_ARCHIVE_BATCH_SIZE = int(os.environ.get("NEWS_ARCHIVE_BATCH_SIZE", "500"))
+NEWS_PAGE_SIZE = 100
+news_archived = Counter("news_archived_total", "External news items moved to the archive tier")
+
+@maintenance_task
+@startup_phase
+async def ensure_news_indexes():
+    await asyncio.gather(*(
+        index
+        for news in (db.news, db.news_archive)
+        for index in (
+            news.create_index("created_at"),
+            news.create_index([("unit_id", 1), ("created_at", -1)]),
+            news.create_index([("unit_id", 1), ("external_url", 1)], sparse=True),
+        )
+    ))
+
+async def archive_news() -> int:
+    """Move external, unpinned news older than NEWS_HOT_DAYS to news_archive"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=NEWS_HOT_DAYS)).isoformat()
+    moved = await archive_documents(
+        db.news, db.news_archive,
+        {"is_external": True, "pinned": {"$ne": True}, "created_at": {"$lt": cutoff}},
+        NEWS_ARCHIVE_BATCH_SIZE)
+    if moved:
+        news_archived.inc((), moved)
+        invalidate_payloads("news")
+        logger.info(f"Archived {moved} external news items older than {NEWS_HOT_DAYS:g} days")
+    return moved
+
+async def news_archiver():
+    while True:
+        try:
+            async with lease("news-archive") as held:
+                if held:
+                    await archive_news()
+        except Exception as e:
+            logger.error(f"Error archiving news: {e}")
+        await asyncio.sleep(NEWS_ARCHIVE_INTERVAL_SECONDS)
+
+async def find_news(query: dict, offset: int, limit: int) -> List[dict]:
+    """A page of news across both tiers, newest first"""
+    wanted = offset + limit
+    hot, archived = await asyncio.gather(
+        db.news.find(query, {"_id": 0}).sort("created_at", -1).to_list(wanted),
+        db.news_archive.find(query, {"_id": 0, "archived_at": 0}).sort("created_at", -1).to_list(wanted),
+    )
+    merged = heapq.merge(hot, archived, key=lambda news: news["created_at"], reverse=True)
+    return [news for _, news in zip(range(wanted), merged)][offset:]
+
 # News Routes
-@api_router.get("/news", response_model=List[News])
-async def get_news():
-    news_list = await db.news.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+def news_posted_event(news_doc: dict) -> dict:
+    return {"recipient": "*", "unit_id": news_doc["unit_id"], "kind": "news_posted",
+            "payload": {"news_id": news_doc["id"], "title": news_doc["title"]}}
+
+async def load_news(unit_id: str) -> List[dict]:
+    # Same merge as every other page, so paging on from it neither skips nor repeats
+    news_list = await find_news({"unit_id": unit_id}, 0, NEWS_PAGE_SIZE)
     
     for news in news_list:
         if isinstance(news['created_at'], str):
@@ -291,12 +2328,33 @@ async def get_news():
     
     return news_list
 
+@api_router.get("/news", response_model=List[News])
+async def get_news(request: Request, q: Optional[str] = None, offset: int = Query(0, ge=0, le=10000),
+                   limit: int = Query(NEWS_PAGE_SIZE, ge=1, le=NEWS_PAGE_SIZE),
+                   unit_id: str = Depends(get_request_unit)):
+    """Newest news; `q` searches titles and content, `offset` pages back into the archive"""
+    if not q and offset == 0 and limit == NEWS_PAGE_SIZE:
+        return await cached_json_response(request, scoped(unit_id, "news"), lambda: load_news(unit_id), ("news",))
+    
+    query = {"unit_id": unit_id}
+    if q:
+        pattern = {"$regex": re.escape(q), "$options": "i"}
+        query["$or"] = [{"title": pattern}, {"content": pattern}]
+    news_list = await find_news(query, offset, limit)
+    for news in news_list:
+        if isinstance(news['created_at'], str):
+            news['created_at'] = datetime.fromisoformat(news['created_at'])
+    
+    return news_list
+
 @api_router.post("/news", response_model=News)
 async def create_news(news_data: NewsCreate, current_user: User = Depends(get_admin_user)):
     news = News(
         title=news_data.title,
         content=news_data.content,
         image_url=news_data.image_url,
+        pinned=news_data.pinned,
+        unit_id=current_user.unit_id,
         author_id=current_user.id,
         author_name=current_user.full_name
     )
@@ -305,87 +2363,394 @@ async def create_news(news_data: NewsCreate, current_user: User = Depends(get_ad
     news_doc['created_at'] = news_doc['created_at'].isoformat()
     
     await db.news.insert_one(news_doc)
+    await enqueue_notifications([news_posted_event(news_doc)])
+    invalidate_payloads(scoped(current_user.unit_id, "news"))
+    audit(current_user, "news.create", news.id, {"title": news.title})
     return news
 
 @api_router.put("/news/{news_id}", response_model=News)
-async def update_news(news_id: str, news_data: NewsUpdate, current_user: User = Depends(get_admin_user)):
-    existing_news = await db.news.find_one({"id": news_id}, {"_id": 0})
-    if not existing_news:
-        raise HTTPException(status_code=404, detail="News not found")
-    
+async def update_news(news_id: str, news_data: NewsUpdate, response: Response, if_match: Optional[str] = Header(None),
+                      current_user: TokenClaims = Depends(get_admin_claims)):
     update_data = {k: v for k, v in news_data.model_dump().items() if v is not None}
     
+    updated_news = await versioned_update(
+        db.news, {"id": news_id, "unit_id": current_user.unit_id}, {"$set": update_data} if update_data else {},
+        if_match, "News not found")
     if update_data:
-        await db.news.update_one({"id": news_id}, {"$set": update_data})
-    
-    updated_news = await db.news.find_one({"id": news_id}, {"_id": 0})
+        invalidate_payloads(scoped(current_user.unit_id, "news"))
+        audit(current_user, "news.update", news_id, {"fields": sorted(update_data)})
+    response.headers["ETag"] = version_etag(updated_news)
     if isinstance(updated_news['created_at'], str):
         updated_news['created_at'] = datetime.fromisoformat(updated_news['created_at'])
     
     return News(**updated_news)
 
 @api_router.delete("/news/{news_id}")
-async def delete_news(news_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.news.delete_one({"id": news_id})
+async def delete_news(news_id: str, current_user: TokenClaims = Depends(get_admin_claims)):
+    query = {"id": news_id, "unit_id": current_user.unit_id}
+    result = await db.news.delete_one(query)
+    if result.deleted_count == 0:
+        result = await db.news_archive.delete_one(query)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="News not found")
+    invalidate_payloads(scoped(current_user.unit_id, "news"))
+    audit(current_user, "news.delete", news_id)
     return {"message": "News deleted successfully"}
 
-# Duty Roster Routes
-@api_router.get("/duties", response_model=List[DutyRoster])
-async def get_all_duties(current_user: User = Depends(get_current_user)):
-    """Get all duties"""
-    duties = await db.duties.find({}, {"_id": 0}).sort("duty_date", 1).to_list(10000)
+# Duty partitions
+# db.duties is the live partition. Duties dated before January 1st of the
+# year DUTY_LIVE_DAYS ago are moved to one duties_<year> collection per
+# year, so the live collection and its indexes stay small. Reads go through
+# find_duties(), which queries only the partitions overlapping the requested
+# date range and merges them by date.
+#
+# Each worker caches the list of partitions for DUTY_PARTITION_CACHE_SECONDS
+# instead of listing collections on every read. The partitioner creates a
+# new partition and then waits that long before moving anything into it, so
+# every worker's cache includes it by the time it holds duties.
+DUTY_LIVE_DAYS = int(os.environ.get("DUTY_LIVE_DAYS", "60"))
+DUTY_PARTITION_INTERVAL_SECONDS = float(os.environ.get("DUTY_PARTITION_INTERVAL_SECONDS", str(24 * 3600)))
+DUTY_PARTITION_BATCH_SIZE = int(os.environ.get("DUTY_PARTITION_BATCH_SIZE", "1000"))
+DUTY_PARTITION_CACHE_SECONDS = float(os.environ.get("DUTY_PARTITION_CACHE_SECONDS", "60"))
+DUTY_READ_LIMIT = 10000
+DUTY_PARTITION_NAME = re.compile(r"^duties_(\d{4})$")
+duties_partitioned = Counter("duties_partitioned_total", "Duties moved from the live collection to a yearly partition")
+duty_partition_cache = {"years": None, "expires": 0.0}
+
+async def ensure_duty_indexes(duties):
+    await asyncio.gather(
+        duties.create_index([("unit_id", 1), ("user_id", 1), ("duty_date", 1)]),
+        duties.create_index([("unit_id", 1), ("duty_date", 1)]),
+        duties.create_index("duty_date"),
+    )
+
+@maintenance_task
+@startup_phase
+async def ensure_live_duty_indexes():
+    await ensure_duty_indexes(db.duties)
+
+async def duty_partition_names() -> List[str]:
+    return await db.list_collection_names(filter={"name": {"$regex": DUTY_PARTITION_NAME.pattern}})
+
+async def duty_partition_years(refresh: bool = False) -> List[int]:
+    """Years with a partition, from this worker's cache unless it has expired"""
+    if refresh or duty_partition_cache["years"] is None or duty_partition_cache["expires"] <= time.monotonic():
+        async def load():
+            years = sorted(int(DUTY_PARTITION_NAME.match(name).group(1)) for name in await duty_partition_names())
+            duty_partition_cache.update(years=years, expires=time.monotonic() + DUTY_PARTITION_CACHE_SECONDS)
+            return years
+        
+        return await single_flight.run("duty-partitions", load, "duty_partitions")
+    return duty_partition_cache["years"]
+
+async def duty_collections(date_from: Optional[str] = None, date_to: Optional[str] = None) -> list:
+    """The live collection plus every yearly partition overlapping [date_from, date_to]"""
+    first_year = int(date_from[:4]) if date_from else 0
+    last_year = int(date_to[:4]) if date_to else 9999
+    years = [year for year in await duty_partition_years() if first_year <= year <= last_year]
+    return [db.duties] + [db[f"duties_{year}"] for year in years]
+
+def duty_date_query(query: dict, date_from: Optional[str], date_to: Optional[str]) -> dict:
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lte"] = date_to
+    return {**query, "duty_date": date_range} if date_range else query
+
+async def find_duties(query: dict, date_from=None, date_to=None,
+                      limit: Optional[int] = DUTY_READ_LIMIT) -> List[dict]:
+    """Matching duties from every relevant partition, ordered by date.
+
+    `date_from` and `date_to` are inclusive dates or YYYY-MM-DD strings;
+    `limit=None` returns every match.
+    """
+    date_from = str(date_from) if date_from else None
+    date_to = str(date_to) if date_to else None
+    query = duty_date_query(query, date_from, date_to)
+    results = await asyncio.gather(*(
+        duties.find(query, {"_id": 0}).sort("duty_date", 1).to_list(limit)
+        for duties in await duty_collections(date_from, date_to)))
+    
+    # A duty being moved can briefly sit in both its old and new partition
+    merged = []
+    seen = set()
+    for duty in heapq.merge(*results, key=lambda duty: duty["duty_date"]):
+        if duty["id"] in seen:
+            continue
+        seen.add(duty["id"])
+        merged.append(duty)
+        if len(merged) == limit:
+            break
+    return merged
+
+async def delete_duties(query: dict) -> int:
+    """Delete matching duties from every partition"""
+    results = await asyncio.gather(*(duties.delete_many(query) for duties in await duty_collections()))
+    return sum(result.deleted_count for result in results)
+
+async def partition_duties(settle_seconds: float = DUTY_PARTITION_CACHE_SECONDS) -> dict:
+    """Move live duties of past years into their yearly partitions.
+
+    `settle_seconds` is how long to wait after creating a partition for
+    other workers' partition caches to pick it up."""
+    boundary_year = (date.today() - timedelta(days=DUTY_LIVE_DAYS)).year
+    oldest = await db.duties.find(
+        {"duty_date": {"$lt": f"{boundary_year}-01-01"}}, {"_id": 0, "duty_date": 1}
+    ).sort("duty_date", 1).limit(1).to_list(1)
+    moved = {}
+    if not oldest:
+        return moved
+    
+    years = range(int(oldest[0]["duty_date"][:4]), boundary_year)
+    existing = await duty_partition_years(refresh=True)
+    new_years = [year for year in years if year not in existing]
+    if new_years:
+        # Creates the collections, so readers include them before anything moves
+        await asyncio.gather(*(ensure_duty_indexes(db[f"duties_{year}"]) for year in new_years))
+        await duty_partition_years(refresh=True)
+        await asyncio.sleep(settle_seconds)
+    
+    for year in years:
+        partition = db[f"duties_{year}"]
+        count = await archive_documents(
+            db.duties, partition,
+            {"duty_date": {"$gte": f"{year}-01-01", "$lt": f"{year + 1}-01-01"}},
+            DUTY_PARTITION_BATCH_SIZE)
+        if count:
+            moved[year] = count
+            duties_partitioned.inc((), count)
+    if moved:
+        logger.info(f"Moved duties to yearly partitions: {moved}")
+    return moved
+
+async def duty_partitioner():
+    while True:
+        try:
+            async with lease("duty-partition") as held:
+                if held:
+                    await partition_duties()
+        except Exception as e:
+            logger.error(f"Error partitioning duties: {e}")
+        await asyncio.sleep(DUTY_PARTITION_INTERVAL_SECONDS)
+
+# Monthly rosters
+# One rosters document per month: days maps each date to the ids on duty,
+# names maps those ids to their names, so the calendar view is one document
+# read and a rename is one update. Duty writes patch the affected months in
+# place. A missing month, or one built more than ROSTER_REBUILD_SECONDS ago,
+# is rebuilt from the duties on read, which also heals any drift.
+#
+# Every patch bumps the month's revision, creating a placeholder (never
+# built, so rebuilt on read) if the month is missing. A rebuild only stores
+# its result if the revision is still the one it saw before reading the
+# duties; otherwise a duty write landed meanwhile and may be missing from
+# what it read, so the result is served once and the next read builds again.
+ROSTER_REBUILD_SECONDS = float(os.environ.get("ROSTER_REBUILD_SECONDS", str(24 * 3600)))
+roster_builds = Counter("roster_builds_total", "Month roster rebuilds by outcome", ("result",))
+MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def month_bounds(month: str) -> tuple:
+    first = date.fromisoformat(f"{month}-01")
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+async def build_roster(unit_id: str, month: str, current: Optional[dict] = None) -> dict:
+    """Rebuild a month from the duties; `current` is its document as read
+    before this call, if any"""
+    first, last = month_bounds(month)
+    days = {}
+    names = {}
+    for duty in await find_duties({"unit_id": unit_id}, first, last, limit=None):
+        days.setdefault(duty["duty_date"], []).append(duty["user_id"])
+        names[duty["user_id"]] = duty["user_name"]
+    
+    roster = {
+        "_id": scoped(unit_id, month),
+        "unit_id": unit_id,
+        "days": days,
+        "names": names,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "revision": current.get("revision", 0) if current else 0,
+    }
+    if current is None:
+        try:
+            await db.rosters.insert_one(roster)
+            stored = True
+        except DuplicateKeyError:
+            stored = False
+    else:
+        result = await db.rosters.replace_one({"_id": roster["_id"], "revision": current.get("revision")}, roster)
+        stored = result.matched_count == 1
+    roster_builds.inc(("stored" if stored else "conflict",))
+    return roster
+
+async def load_roster(unit_id: str, month: str) -> dict:
+    roster = await db.rosters.find_one({"_id": scoped(unit_id, month)})
+    stale_before = (datetime.now(timezone.utc) - timedelta(seconds=ROSTER_REBUILD_SECONDS)).isoformat()
+    if roster is None or roster["built_at"] < stale_before:
+        roster = await build_roster(unit_id, month, roster)
     
+    names = roster["names"]
+    return {
+        "month": month,
+        "days": {
+            day: [{"user_id": user_id, "user_name": names.get(user_id)} for user_id in user_ids]
+            for day, user_ids in sorted(roster["days"].items()) if user_ids
+        },
+    }
+
+async def patch_rosters(duties: List[dict], operator: str):
+    """Add ($addToSet) or remove ($pull) duties in their month documents.
+
+    Bumps each month's revision; a missing month gets a placeholder that is
+    built on first read.
+    """
+    updates = {}
+    for duty in duties:
+        duty_date = duty["duty_date"]
+        if not DATE_PATTERN.match(duty_date):
+            continue
+        unit_id = duty.get("unit_id", DEFAULT_UNIT_ID)
+        update = updates.setdefault((unit_id, duty_date[:7]), {
+            operator: {}, "$set": {}, "$inc": {"revision": 1}, "$setOnInsert": {"unit_id": unit_id, "built_at": ""}})
+        update[operator].setdefault(f"days.{duty_date}", []).append(duty["user_id"])
+        if operator == "$addToSet":
+            update["$set"][f"names.{duty['user_id']}"] = duty["user_name"]
+    if not updates:
+        return
+    
+    modifier = "$each" if operator == "$addToSet" else "$in"
+    requests = []
+    for (unit_id, month), update in updates.items():
+        update[operator] = {field: {modifier: user_ids} for field, user_ids in update[operator].items()}
+        if not update["$set"]:
+            del update["$set"]
+        requests.append(UpdateOne({"_id": scoped(unit_id, month)}, update, upsert=True))
+    await db.rosters.bulk_write(requests, ordered=False)
+    invalidate_tags(*(scoped(unit_id, f"roster:{month}") for unit_id, month in updates))
+
+async def roster_add(duties: List[dict]):
+    await patch_rosters(duties, "$addToSet")
+
+async def roster_remove(duties: List[dict]):
+    await patch_rosters(duties, "$pull")
+
+async def rename_duty_user(unit_id: str, user_id: str, full_name: str):
+    """Propagate a new name to the user's duties and month rosters"""
+    await asyncio.gather(
+        db.rosters.update_many(
+            {"unit_id": unit_id, f"names.{user_id}": {"$exists": True}}, {"$set": {f"names.{user_id}": full_name}}),
+        *(duties.update_many({"unit_id": unit_id, "user_id": user_id}, {"$set": {"user_name": full_name}})
+          for duties in await duty_collections()),
+    )
+    invalidate_duties(unit_id, user_id)
+    invalidate_tags(scoped(unit_id, "rosters"))
+
+# Duty Roster Routes
+def duty_assigned_event(duty: dict) -> dict:
+    return {"recipient": duty["user_id"], "unit_id": duty["unit_id"], "kind": "duty_assigned", "payload": {"duty_date": duty["duty_date"]}}
+
+def parse_duties(duties: List[dict]) -> List[dict]:
     for duty in duties:
         if isinstance(duty['created_at'], str):
             duty['created_at'] = datetime.fromisoformat(duty['created_at'])
     
     return duties
 
+async def load_all_duties(unit_id: str) -> List[dict]:
+    return parse_duties(await find_duties({"unit_id": unit_id}))
+
+@api_router.get("/duties", response_model=List[DutyRoster])
+async def get_all_duties(request: Request, date_from: Optional[date] = Query(None, alias="from"),
+                         date_to: Optional[date] = Query(None, alias="to"),
+                         current_user: TokenClaims = Depends(get_token_claims)):
+    """Get all duties (the full roster export, served from the payload cache).
+
+    `from` and `to` (YYYY-MM-DD, inclusive) limit the range, and with it the
+    partitions read.
+    """
+    unit_id = current_user.unit_id
+    if not date_from and not date_to:
+        return await cached_json_response(
+            request, scoped(unit_id, "duties"), lambda: load_all_duties(unit_id), ("duties",))
+    
+    async def render():
+        duties = parse_duties(await find_duties({"unit_id": unit_id}, date_from, date_to))
+        data = jsonable_encoder(duties)
+        return CachedPayload(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    
+    return await cached_payload_response(
+        request, range_payload_cache, scoped(unit_id, f"duties:{date_from}:{date_to}"), render,
+        (scoped(unit_id, "duties"), "duties"), "application/json")
+
+async def load_user_duties(unit_id: str, user_id: str, date_from: Optional[date] = None,
+                           date_to: Optional[date] = None) -> List[dict]:
+    async def query():
+        return parse_duties(await find_duties({"unit_id": unit_id, "user_id": user_id}, date_from, date_to))
+    
+    key = scoped(unit_id, user_id if not date_from and not date_to else f"{user_id}:{date_from}:{date_to}")
+    return await user_duties_cache.get_or_load(key, query, (f"duties:{user_id}",))
+
 @api_router.get("/duties/my", response_model=List[DutyRoster])
-async def get_my_duties(current_user: User = Depends(get_current_user)):
+async def get_my_duties(date_from: Optional[date] = Query(None, alias="from"), date_to: Optional[date] = Query(None, alias="to"),
+                        current_user: TokenClaims = Depends(get_token_claims)):
     """Get current user's duties"""
-    duties = await db.duties.find({"user_id": current_user.id}, {"_id": 0}).sort("duty_date", 1).to_list(10000)
-    
-    for duty in duties:
-        if isinstance(duty['created_at'], str):
-            duty['created_at'] = datetime.fromisoformat(duty['created_at'])
-    
-    return duties
+    return await load_user_duties(current_user.unit_id, current_user.id, date_from, date_to)
 
 @api_router.get("/duties/user/{user_id}", response_model=List[DutyRoster])
-async def get_user_duties(user_id: str, current_user: User = Depends(get_current_user)):
+async def get_user_duties(user_id: str, date_from: Optional[date] = Query(None, alias="from"),
+                          date_to: Optional[date] = Query(None, alias="to"),
+                          current_user: TokenClaims = Depends(get_token_claims)):
     """Get specific user's duties"""
-    duties = await db.duties.find({"user_id": user_id}, {"_id": 0}).sort("duty_date", 1).to_list(10000)
-    
-    for duty in duties:
-        if isinstance(duty['created_at'], str):
-            duty['created_at'] = datetime.fromisoformat(duty['created_at'])
-    
-    return duties
+    return await load_user_duties(current_user.unit_id, user_id, date_from, date_to)
+
+@api_router.get("/duties/roster/{month}")
+async def get_month_roster(month: str, request: Request, current_user: TokenClaims = Depends(get_token_claims)):
+    """Who is on duty each day of a month (YYYY-MM), for the calendar view"""
+    if not MONTH_PATTERN.match(month):
+        raise HTTPException(status_code=422, detail="Month must be YYYY-MM")
+    
+    async def render():
+        roster = await load_roster(current_user.unit_id, month)
+        return CachedPayload(json.dumps(roster, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    
+    key = scoped(current_user.unit_id, f"roster:{month}")
+    return await cached_payload_response(
+        request, range_payload_cache, key, render, (key, scoped(current_user.unit_id, "rosters")), "application/json")
 
 @api_router.post("/duties/bulk")
-async def create_duties_bulk(duty_data: DutyRosterBulkCreate, current_user: User = Depends(get_admin_user)):
+async def create_duties_bulk(duty_data: DutyRosterBulkCreate, idempotency_key: Optional[str] = Header(None),
+                             current_user: TokenClaims = Depends(get_admin_claims)):
     """Create multiple duties for multiple users at once"""
+    return await run_idempotent(
+        idempotency_key, "duties-bulk", current_user.id, duty_data,
+        lambda: apply_duties_bulk(duty_data, current_user))
+
+async def apply_duties_bulk(duty_data: DutyRosterBulkCreate, actor: TokenClaims) -> dict:
+    unit_id = actor.unit_id
     created_count = 0
+    changed_user_ids = set()
+    created_duties = []
     
     for user_duty in duty_data.duties:
         user_id = user_duty.get("user_id")
         dates = user_duty.get("dates", [])
         
         # Get user info
-        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user_doc = await db.users.find_one({"id": user_id, "unit_id": unit_id}, {"_id": 0})
         if not user_doc:
             continue  # Skip if user not found
         
         for date_str in dates:
             # Check if duty already exists for this user and date
-            existing = await db.duties.find_one({"user_id": user_id, "duty_date": date_str})
+            existing = await find_duties({"unit_id": unit_id, "user_id": user_id}, date_str, date_str, limit=1)
             if existing:
                 continue  # Skip if already exists
             
             duty = DutyRoster(
+                unit_id=unit_id,
                 user_id=user_id,
                 user_name=user_doc['full_name'],
                 duty_date=date_str
@@ -396,6 +2761,14 @@ async def create_duties_bulk(duty_data: DutyRosterBulkCreate, current_user: User
             
             await db.duties.insert_one(duty_doc)
             created_count += 1
+            changed_user_ids.add(user_id)
+            created_duties.append(duty_doc)
+    
+    if created_count:
+        await roster_add(created_duties)
+        await enqueue_notifications([duty_assigned_event(duty) for duty in created_duties])
+        invalidate_duties(unit_id, *changed_user_ids)
+        audit(actor, "duties.bulk_create", details={"count": created_count, "user_ids": sorted(changed_user_ids)})
     
     return {
         "message": f"Створено {created_count} нарядів",
@@ -403,20 +2776,25 @@ async def create_duties_bulk(duty_data: DutyRosterBulkCreate, current_user: User
     }
 
 @api_router.put("/duties/user/{user_id}")
-async def update_user_duties(user_id: str, duty_update: UserDutiesUpdate, current_user: User = Depends(get_admin_user)):
+async def update_user_duties(user_id: str, duty_update: UserDutiesUpdate, current_user: TokenClaims = Depends(get_admin_claims)):
     """Update duties for a specific user - replace all duties with new dates"""
     # Get user info
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
+    query = {"unit_id": current_user.unit_id, "user_id": user_id}
+    user_doc = await db.users.find_one({"id": user_id, "unit_id": current_user.unit_id}, {"_id": 0})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Delete all existing duties for this user
-    await db.duties.delete_many({"user_id": user_id})
+    previous_duties = await find_duties(query, limit=None)
+    await delete_duties(query)
+    await roster_remove(previous_duties)
     
     # Create new duties
     created_count = 0
+    created_duties = []
     for date_str in duty_update.dates:
         duty = DutyRoster(
+            unit_id=current_user.unit_id,
             user_id=user_id,
             user_name=user_doc['full_name'],
             duty_date=date_str
@@ -427,6 +2805,14 @@ async def update_user_duties(user_id: str, duty_update: UserDutiesUpdate, curren
         
         await db.duties.insert_one(duty_doc)
         created_count += 1
+        created_duties.append(duty_doc)
+    
+    await roster_add(created_duties)
+    previous_dates = {duty["duty_date"] for duty in previous_duties}
+    await enqueue_notifications([
+        duty_assigned_event(duty) for duty in created_duties if duty["duty_date"] not in previous_dates])
+    invalidate_duties(current_user.unit_id, user_id)
+    audit(current_user, "duties.replace", user_id, {"dates": sorted(duty_update.dates)})
     
     return {
         "message": f"Оновлено наряди для {user_doc['full_name']}",
@@ -434,30 +2820,138 @@ async def update_user_duties(user_id: str, duty_update: UserDutiesUpdate, curren
     }
 
 @api_router.delete("/duties/user/{user_id}")
-async def delete_user_duties(user_id: str, current_user: User = Depends(get_admin_user)):
+async def delete_user_duties(user_id: str, current_user: TokenClaims = Depends(get_admin_claims)):
     """Delete all duties for a specific user"""
-    result = await db.duties.delete_many({"user_id": user_id})
+    query = {"unit_id": current_user.unit_id, "user_id": user_id}
+    previous_duties = await find_duties(query, limit=None)
+    deleted_count = await delete_duties(query)
+    if deleted_count:
+        await roster_remove(previous_duties)
+        invalidate_duties(current_user.unit_id, user_id)
+        audit(current_user, "duties.delete", user_id, {"count": deleted_count})
     return {
-        "message": f"Видалено {result.deleted_count} нарядів",
-        "count": result.deleted_count
+        "message": f"Видалено {deleted_count} нарядів",
+        "count": deleted_count
     }
 
-@api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_admin_user)):
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+# Calendar feed
+# Calendar apps can't send an Authorization header, so each user gets a
+# revocable feed token; only its SHA-256 is stored (users.feed_token_hash).
+# The rendered calendar is cached per user under the user's duty tag.
+def feed_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def ical_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def ical_fold(line: str) -> str:
+    """Fold content lines longer than 75 octets (RFC 5545 3.1)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1  # don't split a UTF-8 sequence
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts)
+
+def render_calendar(unit_name: str, duties: List[dict]) -> bytes:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Military Unit//Duty Roster//UK",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{ical_escape(unit_name)} — наряди",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+    ]
+    for duty in duties:
+        day = datetime.fromisoformat(duty["duty_date"]).date()
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{duty['id']}@military-unit",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}",
+            "SUMMARY:Наряд",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(ical_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+async def resolve_feed_token(token: str) -> Optional[dict]:
+    """The feed owner's id and unit_id, if the token is current"""
+    token_hash = feed_token_hash(token)
     
-    for user in users:
-        if isinstance(user['created_at'], str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
+    async def query():
+        user = await db.users.find_one({"feed_token_hash": token_hash}, {"_id": 0, "id": 1, "unit_id": 1})
+        return user or {}
     
-    return users
+    user = await feed_tokens_cache.get_or_load(token_hash, query, (f"feed-token:{token_hash}",))
+    if not user or await current_token_version(user["id"]) is None:
+        return None
+    return user
 
-@api_router.put("/users/{user_id}", response_model=User)
-async def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depends(get_admin_user)):
-    existing_user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not existing_user:
+@api_router.post("/duties/my/calendar-token")
+async def create_calendar_token(current_user: TokenClaims = Depends(get_token_claims)):
+    """Issue a new calendar feed URL, revoking the previous one"""
+    token = secrets.token_urlsafe(24)
+    previous = await db.users.find_one_and_update(
+        {"id": current_user.id}, {"$set": {"feed_token_hash": feed_token_hash(token)}},
+        projection={"feed_token_hash": 1})
+    if previous is None:
         raise HTTPException(status_code=404, detail="User not found")
+    if previous.get("feed_token_hash"):
+        invalidate_tags(f"feed-token:{previous['feed_token_hash']}")
+    return {"token": token, "url": f"/api/duties/calendar/{token}.ics"}
+
+@api_router.delete("/duties/my/calendar-token")
+async def revoke_calendar_token(current_user: TokenClaims = Depends(get_token_claims)):
+    previous = await db.users.find_one_and_update(
+        {"id": current_user.id}, {"$unset": {"feed_token_hash": ""}},
+        projection={"feed_token_hash": 1})
+    if previous and previous.get("feed_token_hash"):
+        invalidate_tags(f"feed-token:{previous['feed_token_hash']}")
+    return {"message": "Calendar feed revoked"}
+
+@api_router.get("/duties/calendar/{token}.ics")
+async def get_duty_calendar(token: str, request: Request):
+    """iCalendar feed of one user's duties, for calendar app subscriptions"""
+    user = await resolve_feed_token(token)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    user_id, unit_id = user["id"], user["unit_id"]
     
+    async def render():
+        settings, duties = await asyncio.gather(load_settings(unit_id), load_user_duties(unit_id, user_id))
+        return CachedPayload(render_calendar(settings.unit_name, duties))
+    
+    return await cached_payload_response(
+        request, calendar_cache, user_id, render, (f"duties:{user_id}", scoped(unit_id, "settings")),
+        "text/calendar; charset=utf-8")
+
+@api_router.get("/users", response_model=List[User])
+async def get_users(current_user: TokenClaims = Depends(get_admin_claims)):
+    async def query():
+        users = await db.users.find({"unit_id": current_user.unit_id}, {"_id": 0, "password": 0}).to_list(1000)
+        
+        for user in users:
+            if isinstance(user['created_at'], str):
+                user['created_at'] = datetime.fromisoformat(user['created_at'])
+        
+        return users
+    
+    return await users_cache.get_or_load(current_user.unit_id, query, (scoped(current_user.unit_id, "users"),))
+
+@api_router.put("/users/{user_id}", response_model=User)
+async def update_user(user_id: str, user_data: UserUpdate, response: Response, if_match: Optional[str] = Header(None),
+                      current_user: TokenClaims = Depends(get_admin_claims)):
     update_data = {}
     if user_data.full_name:
         update_data['full_name'] = user_data.full_name
@@ -471,201 +2965,675 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: User =
     if user_data.role:
         update_data['role'] = user_data.role
     
+    try:
+        updated_user = await versioned_update(
+            db.users, {"id": user_id, "unit_id": current_user.unit_id}, token_update(update_data), if_match,
+            "User not found", {"_id": 0, "password": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already in use")
     if update_data:
-        await db.users.update_one({"id": user_id}, {"$set": update_data})
-    
-    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+        invalidate_tags(scoped(current_user.unit_id, "users"))
+        details = {"fields": sorted(update_data)}
+        if 'role' in update_data:
+            details['role'] = update_data['role']
+        audit(current_user, "user.update", user_id, details)
+    if 'full_name' in update_data:
+        await rename_duty_user(current_user.unit_id, user_id, update_data['full_name'])
+    response.headers["ETag"] = version_etag(updated_user)
+    token_versions[user_id] = updated_user.get('token_version', 0)
+    if user_id == current_user.id and updated_user.get('token_version', 0) != current_user.token_version:
+        response.headers["X-Access-Token"] = create_user_token(updated_user)
     if isinstance(updated_user['created_at'], str):
         updated_user['created_at'] = datetime.fromisoformat(updated_user['created_at'])
     
     return User(**updated_user)
 
 @api_router.delete("/users/{user_id}")
-async def delete_user(user_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.users.delete_one({"id": user_id})
+async def delete_user(user_id: str, current_user: TokenClaims = Depends(get_admin_claims)):
+    result = await db.users.delete_one({"id": user_id, "unit_id": current_user.unit_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    token_versions[user_id] = None
+    invalidate_tags(scoped(current_user.unit_id, "users"))
+    enqueue_compaction(user_id)
+    audit(current_user, "user.delete", user_id)
     return {"message": "User deleted successfully"}
 
+# Bulk user import
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "200"))
+IMPORT_HASH_WORKERS = int(os.environ.get("IMPORT_HASH_WORKERS", str(os.cpu_count() or 2)))
+IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "5000"))
+hash_pool = None
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """bcrypt is CPU-bound; hash imports on a process pool, created on first use.
+
+    Spawned rather than forked: forking a process that runs motor's threads
+    can deadlock the child. Workers run passwords.hash_password, so each
+    imports that module and passlib, not this one."""
+    global hash_pool
+    if hash_pool is None:
+        hash_pool = ProcessPoolExecutor(
+            max_workers=IMPORT_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return hash_pool
+
+def parse_import_rows(body: bytes, content_type: str) -> tuple:
+    """Rows and group id from a CSV (email,password,full_name,rank) or JSON upload"""
+    if content_type.startswith("text/csv"):
+        reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        # Fields beyond the header (a trailing comma, say) land under None
+        return [{k: v for k, v in row.items() if k is not None} for row in reader], None
+    try:
+        data = UserImport.model_validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return data.users, data.group_id
+
+async def import_users(rows: List[dict], group_id: Optional[str], actor: TokenClaims):
+    """Yield one NDJSON line per row, then a summary line"""
+    unit_id = actor.unit_id
+    def line(data: dict) -> bytes:
+        return (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+    
+    counts = {"created": 0, "exists": 0, "invalid": 0}
+    valid = []
+    seen = set()
+    for index, row in enumerate(rows):
+        try:
+            user_data = UserCreate(**{k: v for k, v in row.items() if v not in (None, "")})
+        except ValidationError as e:
+            error = e.errors()[0]
+            counts["invalid"] += 1
+            yield line({"row": index, "email": row.get("email"), "status": "invalid",
+                        "error": f"{'.'.join(map(str, error['loc']))}: {error['msg']}"})
+            continue
+        except TypeError:
+            # A key that isn't a string; parse_import_rows drops the one CSV makes
+            counts["invalid"] += 1
+            yield line({"row": index, "email": row.get("email"), "status": "invalid",
+                        "error": "Unexpected field names"})
+            continue
+        email = user_data.email
+        if email in seen:
+            counts["invalid"] += 1
+            yield line({"row": index, "email": email, "status": "invalid", "error": "Duplicate email in upload"})
+            continue
+        seen.add(email)
+        valid.append((index, email, user_data))
+    
+    # One query for every email already registered
+    existing = {
+        user["email"]
+        for user in await db.users.find({"email": {"$in": list(seen)}}, {"_id": 0, "email": 1}).to_list(None)
+    }
+    pending = []
+    for index, email, user_data in valid:
+        if email in existing:
+            counts["exists"] += 1
+            yield line({"row": index, "email": email, "status": "exists"})
+        else:
+            pending.append((index, email, user_data))
+    
+    loop = asyncio.get_running_loop()
+    pool = get_hash_pool()
+    hash_password = lazy_import("passwords").hash_password
+    created_ids = []
+    for start in range(0, len(pending), IMPORT_CHUNK_SIZE):
+        chunk = pending[start:start + IMPORT_CHUNK_SIZE]
+        hashes = await asyncio.gather(*(
+            loop.run_in_executor(pool, hash_password, user_data.password) for _, _, user_data in chunk))
+        
+        docs = []
+        for (index, email, user_data), password_hash in zip(chunk, hashes):
+            user = User(email=email, full_name=user_data.full_name, rank=user_data.rank, role="user", verified=True,
+                        unit_id=unit_id)
+            user_doc = user.model_dump()
+            user_doc['created_at'] = user_doc['created_at'].isoformat()
+            user_doc['password'] = password_hash
+            docs.append(user_doc)
+        
+        failed = {}
+        try:
+            await db.users.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Registered concurrently by someone else; report the row, keep the rest
+            failed = {error["index"]: error.get("errmsg", "write error") for error in e.details["writeErrors"]}
+        
+        for position, ((index, email, _), user_doc) in enumerate(zip(chunk, docs)):
+            if position in failed:
+                counts["exists"] += 1
+                yield line({"row": index, "email": email, "status": "exists"})
+                continue
+            counts["created"] += 1
+            created_ids.append(user_doc["id"])
+            token_versions[user_doc["id"]] = 0
+            yield line({"row": index, "email": email, "status": "created", "id": user_doc["id"]})
+    
+    if created_ids:
+        invalidate_tags(scoped(unit_id, "users"))
+        if group_id:
+            await db.groups.update_one(
+                {"id": group_id, "unit_id": unit_id},
+                {"$addToSet": {"member_ids": {"$each": created_ids}}, "$inc": {"version": 1}})
+            invalidate_tags(scoped(unit_id, "groups"))
+    
+    audit(actor, "users.import", group_id, counts)
+    yield line({"summary": counts, "group_id": group_id})
+
+@api_router.post("/users/import")
+async def import_users_bulk(request: Request, group_id: Optional[str] = None,
+                            current_user: TokenClaims = Depends(get_admin_claims)):
+    """Create many users from CSV or JSON, optionally adding them to a group.
+
+    Streams one JSON line per row as it is processed, then a summary.
+    """
+    rows, body_group_id = parse_import_rows(await request.body(), request.headers.get("content-type", ""))
+    group_id = group_id or body_group_id
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {IMPORT_MAX_ROWS} rows per import")
+    if group_id and not await db.groups.count_documents({"id": group_id, "unit_id": current_user.unit_id}, limit=1):
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    return StreamingResponse(import_users(rows, group_id, current_user), media_type="application/x-ndjson")
+
 # Groups Routes
 @api_router.get("/groups", response_model=List[Group])
-async def get_groups(current_user: User = Depends(get_current_user)):
-    groups = await db.groups.find({}, {"_id": 0}).to_list(1000)
-    
-    for group in groups:
-        if isinstance(group['created_at'], str):
-            group['created_at'] = datetime.fromisoformat(group['created_at'])
+async def get_groups(current_user: TokenClaims = Depends(get_token_claims)):
+    async def query():
+        groups = await db.groups.find({"unit_id": current_user.unit_id}, {"_id": 0}).to_list(1000)
+        
+        for group in groups:
+            if isinstance(group['created_at'], str):
+                group['created_at'] = datetime.fromisoformat(group['created_at'])
+        
+        return groups
     
-    return groups
+    tags = (scoped(current_user.unit_id, "groups"), "groups")
+    return await groups_cache.get_or_load(current_user.unit_id, query, tags)
 
 @api_router.post("/groups", response_model=Group)
-async def create_group(group_data: GroupCreate, current_user: User = Depends(get_admin_user)):
+async def create_group(group_data: GroupCreate, current_user: TokenClaims = Depends(get_admin_claims)):
     group = Group(
         name=group_data.name,
         description=group_data.description,
-        member_ids=[]
+        member_ids=[],
+        unit_id=current_user.unit_id
     )
     
     group_doc = group.model_dump()
     group_doc['created_at'] = group_doc['created_at'].isoformat()
     
     await db.groups.insert_one(group_doc)
+    invalidate_tags(scoped(current_user.unit_id, "groups"))
+    audit(current_user, "group.create", group.id, {"name": group.name})
     return group
 
 @api_router.put("/groups/{group_id}", response_model=Group)
-async def update_group(group_id: str, group_data: GroupUpdate, current_user: User = Depends(get_admin_user)):
-    existing_group = await db.groups.find_one({"id": group_id}, {"_id": 0})
-    if not existing_group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
+async def update_group(group_id: str, group_data: GroupUpdate, response: Response, if_match: Optional[str] = Header(None),
+                       current_user: TokenClaims = Depends(get_admin_claims)):
     update_data = {k: v for k, v in group_data.model_dump().items() if v is not None}
     
+    updated_group = await versioned_update(
+        db.groups, {"id": group_id, "unit_id": current_user.unit_id}, {"$set": update_data} if update_data else {},
+        if_match, "Group not found")
     if update_data:
-        await db.groups.update_one({"id": group_id}, {"$set": update_data})
-    
-    updated_group = await db.groups.find_one({"id": group_id}, {"_id": 0})
+        invalidate_tags(scoped(current_user.unit_id, "groups"))
+        audit(current_user, "group.update", group_id, {"fields": sorted(update_data)})
+    response.headers["ETag"] = version_etag(updated_group)
     if isinstance(updated_group['created_at'], str):
         updated_group['created_at'] = datetime.fromisoformat(updated_group['created_at'])
     
     return Group(**updated_group)
 
 @api_router.delete("/groups/{group_id}")
-async def delete_group(group_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.groups.delete_one({"id": group_id})
+async def delete_group(group_id: str, current_user: TokenClaims = Depends(get_admin_claims)):
+    result = await db.groups.delete_one({"id": group_id, "unit_id": current_user.unit_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Group not found")
+    invalidate_tags(scoped(current_user.unit_id, "groups"))
+    audit(current_user, "group.delete", group_id)
     return {"message": "Group deleted successfully"}
 
-@api_router.get("/groups/my", response_model=List[Group])
-async def get_my_groups(current_user: User = Depends(get_current_user)):
-    groups = await db.groups.find({"member_ids": current_user.id}, {"_id": 0}).to_list(1000)
-    
-    for group in groups:
-        if isinstance(group['created_at'], str):
-            group['created_at'] = datetime.fromisoformat(group['created_at'])
+async def load_user_groups(unit_id: str, user_id: str) -> List[dict]:
+    async def query():
+        groups = await db.groups.find({"unit_id": unit_id, "member_ids": user_id}, {"_id": 0}).to_list(1000)
+        
+        for group in groups:
+            if isinstance(group['created_at'], str):
+                group['created_at'] = datetime.fromisoformat(group['created_at'])
+        
+        return groups
     
-    return groups
+    return await user_groups_cache.get_or_load(user_id, query, (scoped(unit_id, "groups"), "groups"))
 
-@api_router.get("/groups/{group_id}/members", response_model=List[User])
-async def get_group_members(group_id: str, current_user: User = Depends(get_current_user)):
-    """Get all members of a specific group"""
-    group = await db.groups.find_one({"id": group_id}, {"_id": 0})
+@api_router.get("/groups/my", response_model=List[Group])
+async def get_my_groups(current_user: TokenClaims = Depends(get_token_claims)):
+    return await load_user_groups(current_user.unit_id, current_user.id)
+
+async def get_member_group(group_id: str, current_user: TokenClaims) -> dict:
+    """The group, if it exists and the caller is a member or an admin"""
+    group = await db.groups.find_one({"id": group_id, "unit_id": current_user.unit_id}, {"_id": 0})
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
     
     # Check if current user is a member of this group
     if current_user.id not in group.get('member_ids', []) and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
+    return group
+
+async def find_members(unit_id: str, member_ids: List[str], projection: dict) -> List[dict]:
+    """Users by id in one query, in member_ids order"""
+    users = await db.users.find({"unit_id": unit_id, "id": {"$in": member_ids}}, projection).to_list(None)
+    by_id = {user["id"]: user for user in users}
+    return [by_id[member_id] for member_id in member_ids if member_id in by_id]
+
+@api_router.get("/groups/{group_id}/members", response_model=List[User])
+async def get_group_members(group_id: str, current_user: TokenClaims = Depends(get_token_claims)):
+    """Get all members of a specific group"""
+    group = await get_member_group(group_id, current_user)
     
     # Get all members
     members = []
-    for member_id in group.get('member_ids', []):
-        user_doc = await db.users.find_one({"id": member_id}, {"_id": 0, "password": 0})
-        if user_doc:
-            if isinstance(user_doc['created_at'], str):
-                user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-            members.append(User(**user_doc))
+    for user_doc in await find_members(current_user.unit_id, group.get('member_ids', []), {"_id": 0, "password": 0}):
+        if isinstance(user_doc['created_at'], str):
+            user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
+        members.append(User(**user_doc))
     
     return members
 
+@api_router.get("/groups/{group_id}/duties", response_model=List[MemberDuties])
+async def get_group_duties(group_id: str, request: Request, date_from: Optional[date] = Query(None, alias="from"),
+                           date_to: Optional[date] = Query(None, alias="to"),
+                           current_user: TokenClaims = Depends(get_token_claims)):
+    """Duties of every group member in [from, to], grouped by member"""
+    group = await get_member_group(group_id, current_user)
+    member_ids = group.get('member_ids', [])
+    unit_id = current_user.unit_id
+    
+    async def render():
+        members, duties = await asyncio.gather(
+            find_members(unit_id, member_ids, {"_id": 0, "id": 1, "full_name": 1, "rank": 1}),
+            find_duties({"unit_id": unit_id, "user_id": {"$in": member_ids}}, date_from, date_to),
+        )
+        by_member = {member["id"]: [] for member in members}
+        for duty in parse_duties(duties):
+            if duty["user_id"] in by_member:
+                by_member[duty["user_id"]].append(duty)
+        
+        data = jsonable_encoder([
+            MemberDuties(user_id=member["id"], full_name=member["full_name"], rank=member.get("rank"),
+                         duties=by_member[member["id"]])
+            for member in members
+        ])
+        return CachedPayload(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    
+    return await cached_payload_response(
+        request, range_payload_cache, scoped(unit_id, f"group-duties:{group_id}:{date_from}:{date_to}"), render,
+        (scoped(unit_id, "duties"), scoped(unit_id, "groups"), scoped(unit_id, "users"), "duties", "groups"),
+        "application/json")
+
 # External News Integration
-import feedparser
-from bs4 import BeautifulSoup
+async def _http_request_started(request):
+    request.extensions["started"] = time.perf_counter()
+    request.extensions["started_at"] = time.time()
+    request.extensions["parent_span"] = current_span.get()
 
-import httpx
+async def _http_response_received(response):
+    started = response.request.extensions.get("started")
+    if started is not None:
+        duration = time.perf_counter() - started
+        # The Host header, not the URL: feed fetches connect to a resolved address
+        host = response.request.headers.get("host", response.request.url.host)
+        outbound_http_duration.observe((host, str(response.status_code)), duration)
+        record_span(response.request.extensions["parent_span"], "http.request",
+                    response.request.extensions["started_at"], duration,
+                    method=response.request.method, host=host, status=response.status_code)
 
-async def fetch_image_from_page(url: str) -> str:
-    """Fetch post-thumbnail image from news page"""
+def http_client(**kwargs):
+    """httpx.AsyncClient that reports outbound request timings"""
+    httpx = lazy_import("httpx")
+    return httpx.AsyncClient(
+        event_hooks={"request": [_http_request_started], "response": [_http_response_received]},
+        **kwargs,
+    )
+
+# News sources
+# Feeds to ingest live in news_sources, per unit, each with its own poll
+# interval, item cap and image strategy. news_poller (one worker, under a
+# lease) ingests the sources whose next_poll_at has passed; POST /news/sync
+# ingests a unit's sources on demand. Sources are fetched concurrently over
+# one shared httpx client, with at most NEWS_FETCH_PER_HOST requests in
+# flight to any one host, so feeds and article pages on the same site don't
+# hammer it.
+#
+# Any unit's admin can register a feed, so every fetch (feed, article page,
+# each redirect) resolves its host first and refuses loopback, private,
+# link-local and other non-public addresses, then connects to the address it
+# checked so a second DNS answer can't point elsewhere.
+NEWS_POLL_TICK_SECONDS = float(os.environ.get("NEWS_POLL_TICK_SECONDS", "60"))
+NEWS_FETCH_MAX_CONNECTIONS = int(os.environ.get("NEWS_FETCH_MAX_CONNECTIONS", "20"))
+NEWS_FETCH_PER_HOST = int(os.environ.get("NEWS_FETCH_PER_HOST", "4"))
+NEWS_FETCH_TIMEOUT_SECONDS = float(os.environ.get("NEWS_FETCH_TIMEOUT_SECONDS", "10"))
+NEWS_FETCH_MAX_REDIRECTS = 5
+# Only for development against feeds served from the local network
+NEWS_FETCH_ALLOW_PRIVATE = os.environ.get("NEWS_FETCH_ALLOW_PRIVATE", "false").lower() == "true"
+NEWS_SOURCE_MAX_ITEMS = 50
+NEWS_SOURCE_MIN_INTERVAL_SECONDS = 60
+# page: article page's post-thumbnail, else its og:image; og: og:image only;
+# feed: media/enclosure from the feed entry, no page fetch; none: no image
+NEWS_IMAGE_STRATEGIES = ("page", "og", "feed", "none")
+news_ingested = Counter("news_ingested_total", "News items created by feed ingestion", ("source",))
+feed_client = None
+host_slots = {}
+
+def default_news_source(unit_id: str) -> NewsSource:
+    return NewsSource(
+        name="ArmyInform",
+        feed_url="https://armyinform.com.ua/category/news/feed/",
+        source="armyinform.com.ua",
+        author_id="armyinform",
+        unit_id=unit_id,
+        next_poll_at=datetime.now(timezone.utc),
+    )
+
+def news_source_doc(news_source: NewsSource) -> dict:
+    doc = news_source.model_dump()
+    doc['created_at'] = doc['created_at'].isoformat()
+    return doc
+
+def check_news_source(data: dict):
+    """Raise 422 for settings outside the supported ranges"""
+    if "feed_url" in data and not re.match(r"^https?://[^/\s]+", data["feed_url"]):
+        raise HTTPException(status_code=422, detail="feed_url must be an http(s) URL")
+    if "max_items" in data and not 1 <= data["max_items"] <= NEWS_SOURCE_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"max_items must be between 1 and {NEWS_SOURCE_MAX_ITEMS}")
+    interval = data.get("poll_interval_seconds")
+    if interval is not None and interval != 0 and interval < NEWS_SOURCE_MIN_INTERVAL_SECONDS:
+        raise HTTPException(
+            status_code=422, detail=f"poll_interval_seconds must be 0 or at least {NEWS_SOURCE_MIN_INTERVAL_SECONDS}")
+    if "image_strategy" in data and data["image_strategy"] not in NEWS_IMAGE_STRATEGIES:
+        raise HTTPException(status_code=422, detail=f"image_strategy must be one of {', '.join(NEWS_IMAGE_STRATEGIES)}")
+
+def get_feed_client():
+    """The httpx client every feed and article fetch shares, created on first use"""
+    global feed_client
+    if feed_client is None:
+        httpx = lazy_import("httpx")
+        feed_client = http_client(
+            timeout=NEWS_FETCH_TIMEOUT_SECONDS,
+            follow_redirects=False,  # fetch_url checks each hop
+            limits=httpx.Limits(max_connections=NEWS_FETCH_MAX_CONNECTIONS),
+        )
+    return feed_client
+
+async def resolve_public_address(host: str) -> str:
+    """An address of `host` to connect to; ValueError if any of its addresses
+    is not public"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find post-thumbnail image
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"Cannot resolve {host}")
+    addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not NEWS_FETCH_ALLOW_PRIVATE and any(not address.is_global for address in addresses):
+        raise ValueError(f"{host} resolves to a non-public address")
+    return str(addresses[0])
+
+async def fetch_url(url: str):
+    """GET through the shared client, waiting for a free slot on the URL's
+    host and following redirects, each to a checked public address"""
+    target = lazy_import("httpx").URL(url)
+    for _ in range(NEWS_FETCH_MAX_REDIRECTS + 1):
+        if target.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme {target.scheme!r}")
+        host = target.raw_host.decode("ascii")  # IDNA-encoded, as DNS and SNI want it
+        address = await resolve_public_address(host)
+        slots = host_slots.get(host)
+        if slots is None:
+            slots = host_slots[host] = asyncio.Semaphore(NEWS_FETCH_PER_HOST)
+        async with slots:
+            response = await get_feed_client().get(
+                target.copy_with(host=address), headers={"Host": target.netloc.decode("ascii")},
+                extensions={"sni_hostname": host})
+        if not response.is_redirect:
+            response.raise_for_status()
+            return response
+        target = target.join(response.headers["location"])
+    raise ValueError(f"More than {NEWS_FETCH_MAX_REDIRECTS} redirects fetching {url}")
+
+def feed_entry_image(entry) -> Optional[str]:
+    for media in (entry.get("media_content") or []) + (entry.get("media_thumbnail") or []):
+        if media.get("url"):
+            return media["url"]
+    for link in entry.get("links") or []:
+        if link.get("rel") == "enclosure" and link.get("type", "").startswith("image/"):
+            return link.get("href")
+    return None
+
+async def fetch_image_from_page(url: str, strategy: str = "page") -> Optional[str]:
+    """Image of a news page: its post-thumbnail (strategy "page" only), else og:image"""
+    try:
+        response = await fetch_url(url)
+        BeautifulSoup = lazy_import("bs4").BeautifulSoup
+        soup = BeautifulSoup(response.text, 'html.parser')
+        
+        # Find post-thumbnail image
+        if strategy == "page":
             thumbnail = soup.find('img', class_='post-thumbnail')
             if thumbnail and thumbnail.get('src'):
                 return thumbnail['src']
-            
-            # Fallback: find any large image
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                return og_image['content']
-                
+        
+        # Fallback: find any large image
+        og_image = soup.find('meta', property='og:image')
+        if og_image and og_image.get('content'):
+            return og_image['content']
+        
         return None
     except Exception as e:
         logger.error(f"Error fetching image from {url}: {e}")
         return None
 
-async def fetch_armyinform_news():
-    """Fetch news from ArmyInform RSS feed"""
+async def entry_image(entry, strategy: str) -> Optional[str]:
+    if strategy == "feed":
+        return feed_entry_image(entry)
+    if strategy in ("page", "og"):
+        return await fetch_image_from_page(entry.link, strategy)
+    return None
+
+async def ingest_source(news_source: dict) -> dict:
+    """Fetch one source and store its new items; returns a report, never raises"""
+    started = time.perf_counter()
+    unit_id = news_source["unit_id"]
+    report = {"source_id": news_source["id"], "name": news_source["name"], "fetched": 0, "created": 0,
+              "error": None}
+    news_items = []
     try:
-        feed_url = "https://armyinform.com.ua/category/news/feed/"
-        feed = feedparser.parse(feed_url)
+        response = await fetch_url(news_source["feed_url"])
+        feed = await asyncio.to_thread(lazy_import("feedparser").parse, response.content)
+        entries = [entry for entry in feed.entries[:news_source["max_items"]] if entry.get("link")]
+        report["fetched"] = len(entries)
         
-        news_items = []
-        for entry in feed.entries[:10]:  # Get latest 10 news
-            # Check if news already exists
-            existing = await db.news.find_one({"external_url": entry.link})
-            if existing:
-                continue
-            
+        # Skip items already stored, in either tier, with one query each
+        query = {"unit_id": unit_id, "external_url": {"$in": [entry.link for entry in entries]}}
+        existing = set()
+        for tier in (db.news, db.news_archive):
+            docs = await tier.find(query, {"_id": 0, "external_url": 1}).to_list(None)
+            existing.update(doc["external_url"] for doc in docs)
+        entries = [entry for entry in entries if entry.link not in existing]
+        
+        BeautifulSoup = lazy_import("bs4").BeautifulSoup
+        images = await asyncio.gather(*(entry_image(entry, news_source["image_strategy"]) for entry in entries))
+        for entry, image_url in zip(entries, images):
             # Extract clean summary (first 200 chars)
             summary = entry.summary if hasattr(entry, 'summary') else entry.title
-            soup = BeautifulSoup(summary, 'html.parser')
-            clean_summary = soup.get_text()[:200] + "..."
-            
-            # Fetch image from actual page with post-thumbnail class
-            image_url = await fetch_image_from_page(entry.link)
-            
-            news = News(
+            clean_summary = BeautifulSoup(summary, 'html.parser').get_text()[:200] + "..."
+            news_items.append(News(
                 title=entry.title,
                 content=clean_summary,
                 image_url=image_url,
-                author_id="armyinform",
-                author_name="ArmyInform",
+                author_id=news_source["author_id"],
+                author_name=news_source["name"],
                 is_external=True,
                 external_url=entry.link,
-                source="armyinform.com.ua",
+                source=news_source["source"],
+                unit_id=unit_id,
                 created_at=datetime.now(timezone.utc)
-            )
-            
-            news_doc = news.model_dump()
-            news_doc['created_at'] = news_doc['created_at'].isoformat()
-            
-            await db.news.insert_one(news_doc)
-            news_items.append(news)
+            ))
         
-        return news_items
+        if news_items:
+            news_docs = [news.model_dump() for news in news_items]
+            for news_doc in news_docs:
+                news_doc['created_at'] = news_doc['created_at'].isoformat()
+            await db.news.insert_many(news_docs, ordered=False)
+            await enqueue_notifications([news_posted_event(news_doc) for news_doc in news_docs])
+            invalidate_payloads(scoped(unit_id, "news"))
+            news_ingested.inc((news_source["source"],), len(news_items))
+        report["created"] = len(news_items)
     except Exception as e:
-        logger.error(f"Error fetching ArmyInform news: {e}")
-        return []
+        logger.error(f"Error fetching news from {news_source['name']} ({news_source['feed_url']}): {e}")
+        report["error"] = str(e) or type(e).__name__
+    
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    now = datetime.now(timezone.utc)
+    interval = news_source["poll_interval_seconds"]
+    await db.news_sources.update_one({"id": news_source["id"]}, {"$set": {
+        "next_poll_at": now + timedelta(seconds=interval) if interval else None,
+        "last_result": {**report, "at": now.isoformat()},
+    }})
+    return report
 
-@api_router.post("/news/sync-armyinform")
-async def sync_armyinform_news(current_user: User = Depends(get_admin_user)):
-    """Manually sync news from ArmyInform"""
-    news_items = await fetch_armyinform_news()
-    return {
-        "message": f"Синхронізовано {len(news_items)} новин",
-        "count": len(news_items)
-    }
+async def ingest_sources(news_sources: List[dict]) -> List[dict]:
+    return list(await asyncio.gather(*(ingest_source(news_source) for news_source in news_sources)))
+
+async def news_poller():
+    while True:
+        await asyncio.sleep(NEWS_POLL_TICK_SECONDS)
+        try:
+            async with lease("news-poll") as held:
+                if held:
+                    due = await db.news_sources.find(
+                        {"enabled": True, "next_poll_at": {"$lte": datetime.now(timezone.utc)}}, {"_id": 0}
+                    ).to_list(None)
+                    if due:
+                        await ingest_sources(due)
+        except Exception as e:
+            logger.error(f"Error polling news sources: {e}")
+
+@maintenance_task(config=("DEFAULT_UNIT_ID",))
+@startup_phase
+async def seed_news_sources():
+    """Index the registry and give the default unit the ArmyInform feed it always synced"""
+    await asyncio.gather(
+        db.news_sources.create_index([("unit_id", 1), ("id", 1)]),
+        db.news_sources.create_index([("enabled", 1), ("next_poll_at", 1)]),
+    )
+    if not await db.news_sources.count_documents({"unit_id": DEFAULT_UNIT_ID}, limit=1):
+        await db.news_sources.insert_one(news_source_doc(default_news_source(DEFAULT_UNIT_ID)))
+
+# News source Routes
+def parse_news_source(doc: dict) -> NewsSource:
+    if isinstance(doc['created_at'], str):
+        doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+    return NewsSource(**doc)
+
+@api_router.get("/news/sources", response_model=List[NewsSource])
+async def get_news_sources(current_user: TokenClaims = Depends(get_admin_claims)):
+    docs = await db.news_sources.find({"unit_id": current_user.unit_id}, {"_id": 0}).to_list(None)
+    return [parse_news_source(doc) for doc in docs]
+
+@api_router.post("/news/sources", response_model=NewsSource)
+async def create_news_source(source_data: NewsSourceCreate, current_user: TokenClaims = Depends(get_admin_claims)):
+    data = source_data.model_dump()
+    check_news_source(data)
+    source_id = str(uuid.uuid4())
+    news_source = NewsSource(
+        **{**data, "source": data["source"] or data["feed_url"].split("/")[2].lower()},
+        id=source_id,
+        author_id=f"source:{source_id}",
+        unit_id=current_user.unit_id,
+        next_poll_at=datetime.now(timezone.utc) if data["poll_interval_seconds"] else None,
+    )
+    
+    await db.news_sources.insert_one(news_source_doc(news_source))
+    audit(current_user, "news_source.create", source_id, {"name": news_source.name, "feed_url": news_source.feed_url})
+    return news_source
+
+@api_router.put("/news/sources/{source_id}", response_model=NewsSource)
+async def update_news_source(source_id: str, source_data: NewsSourceUpdate, response: Response,
+                             if_match: Optional[str] = Header(None),
+                             current_user: TokenClaims = Depends(get_admin_claims)):
+    update_data = {k: v for k, v in source_data.model_dump().items() if v is not None}
+    check_news_source(update_data)
+    if "poll_interval_seconds" in update_data:
+        # Re-schedule from now under the new interval
+        interval = update_data["poll_interval_seconds"]
+        update_data["next_poll_at"] = datetime.now(timezone.utc) + timedelta(seconds=interval) if interval else None
+    
+    updated_source = await versioned_update(
+        db.news_sources, {"id": source_id, "unit_id": current_user.unit_id},
+        {"$set": update_data} if update_data else {}, if_match, "News source not found")
+    if update_data:
+        audit(current_user, "news_source.update", source_id, {"fields": sorted(update_data)})
+    response.headers["ETag"] = version_etag(updated_source)
+    return parse_news_source(updated_source)
+
+@api_router.delete("/news/sources/{source_id}")
+async def delete_news_source(source_id: str, current_user: TokenClaims = Depends(get_admin_claims)):
+    result = await db.news_sources.delete_one({"id": source_id, "unit_id": current_user.unit_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="News source not found")
+    audit(current_user, "news_source.delete", source_id)
+    return {"message": "News source deleted successfully"}
+
+@api_router.post("/news/sync")
+@api_router.post("/news/sync-armyinform", include_in_schema=False)  # the old single-source route
+async def sync_news(source_id: Optional[str] = None, idempotency_key: Optional[str] = Header(None),
+                    current_user: TokenClaims = Depends(get_admin_claims)):
+    """Ingest the unit's enabled sources now (or only `source_id`), with a report per source"""
+    async def sync():
+        query = {"unit_id": current_user.unit_id}
+        query.update({"id": source_id} if source_id else {"enabled": True})
+        news_sources = await db.news_sources.find(query, {"_id": 0}).to_list(None)
+        if source_id and not news_sources:
+            raise HTTPException(status_code=404, detail="News source not found")
+        
+        started = time.perf_counter()
+        reports = await ingest_sources(news_sources)
+        count = sum(report["created"] for report in reports)
+        audit(current_user, "news.sync", source_id, {"count": count})
+        return {
+            "message": f"Синхронізовано {count} новин",
+            "count": count,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "sources": reports,
+        }
+    
+    return await run_idempotent(idempotency_key, "news-sync", current_user.id, {"source_id": source_id}, sync)
 
 # Settings Routes
-@api_router.get("/settings", response_model=Settings)
-async def get_settings():
-    settings_doc = await db.settings.find_one({"id": "military_unit_settings"}, {"_id": 0})
+def default_settings(unit_id: str) -> Settings:
+    if unit_id == DEFAULT_UNIT_ID:
+        return Settings()
+    return Settings(id=scoped(unit_id, "settings"), unit_id=unit_id)
+
+async def load_settings(unit_id: str) -> Settings:
+    settings_doc = await db.settings.find_one({"unit_id": unit_id}, {"_id": 0})
     
     if not settings_doc:
         # Return default settings if none exist
-        default_settings = Settings()
-        return default_settings
+        return default_settings(unit_id)
     
     if isinstance(settings_doc.get('updated_at'), str):
         settings_doc['updated_at'] = datetime.fromisoformat(settings_doc['updated_at'])
     
     return Settings(**settings_doc)
 
+@api_router.get("/settings", response_model=Settings)
+async def get_settings(request: Request, unit_id: str = Depends(get_request_unit)):
+    return await cached_json_response(request, scoped(unit_id, "settings"), lambda: load_settings(unit_id))
+
 @api_router.put("/settings", response_model=Settings)
-async def update_settings(settings_data: SettingsUpdate, current_user: User = Depends(get_admin_user)):
+async def update_settings(settings_data: SettingsUpdate, response: Response, if_match: Optional[str] = Header(None),
+                          current_user: TokenClaims = Depends(get_admin_claims)):
     update_data = {k: v for k, v in settings_data.model_dump().items() if v is not None}
     
     if not update_data:
@@ -673,25 +3641,222 @@ async def update_settings(settings_data: SettingsUpdate, current_user: User = De
     
     update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    result = await db.settings.update_one(
-        {"id": "military_unit_settings"},
-        {"$set": update_data}
-    )
-    
-    if result.matched_count == 0:
-        # Create if doesn't exist
-        default_settings = Settings(**update_data)
-        settings_doc = default_settings.model_dump()
-        settings_doc['updated_at'] = settings_doc['updated_at'].isoformat()
-        await db.settings.insert_one(settings_doc)
+    if if_match is None:
+        # Create from defaults if it doesn't exist yet
+        defaults = {
+            k: v for k, v in default_settings(current_user.unit_id).model_dump().items()
+            if k not in update_data and k not in ("version", "unit_id")
+        }
+        updated_settings = await db.settings.find_one_and_update(
+            {"unit_id": current_user.unit_id},
+            {"$set": update_data, "$setOnInsert": defaults, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        updated_settings = await versioned_update(
+            db.settings, {"unit_id": current_user.unit_id}, {"$set": update_data}, if_match, "Settings not found")
     
-    updated_settings = await db.settings.find_one({"id": "military_unit_settings"}, {"_id": 0})
+    invalidate_payloads(scoped(current_user.unit_id, "settings"))
+    audit(current_user, "settings.update", details={"fields": sorted(k for k in update_data if k != "updated_at")})
+    response.headers["ETag"] = version_etag(updated_settings)
     
     if isinstance(updated_settings['updated_at'], str):
         updated_settings['updated_at'] = datetime.fromisoformat(updated_settings['updated_at'])
     
     return Settings(**updated_settings)
 
+# Units Route
+@api_router.post("/units", response_model=Settings)
+async def create_unit(unit_data: UnitCreate, current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Onboard a unit: its settings and first admin. Admins of the default unit only."""
+    if not UNIT_ID_PATTERN.match(unit_data.unit_id):
+        raise HTTPException(status_code=422, detail="unit_id must be lowercase letters, digits and dashes")
+    if await db.settings.count_documents({"unit_id": unit_data.unit_id}, limit=1):
+        raise HTTPException(status_code=409, detail="Unit already exists")
+    if await db.users.find_one({"email": unit_data.admin_email}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    settings = default_settings(unit_data.unit_id).model_copy(update={"unit_name": unit_data.unit_name})
+    settings_doc = settings.model_dump()
+    settings_doc['updated_at'] = settings_doc['updated_at'].isoformat()
+    
+    admin = User(
+        email=unit_data.admin_email,
+        full_name=unit_data.admin_full_name,
+        role="admin",
+        unit_id=unit_data.unit_id,
+        verified=True
+    )
+    admin_doc = admin.model_dump()
+    admin_doc['created_at'] = admin_doc['created_at'].isoformat()
+    admin_doc['password'] = get_password_hash(unit_data.admin_password)
+    
+    try:
+        await db.settings.insert_one(settings_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Unit already exists")
+    try:
+        await db.users.insert_one(admin_doc)
+    except DuplicateKeyError:
+        await db.settings.delete_one({"unit_id": unit_data.unit_id})
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await db.news_sources.insert_one(news_source_doc(default_news_source(unit_data.unit_id)))
+    token_versions[admin.id] = 0
+    audit(current_user, "unit.create", unit_data.unit_id, {"admin_id": admin.id})
+    return settings
+
+# Bootstrap Route
+BOOTSTRAP_SECTIONS = ("me", "settings", "news", "duties", "groups")
+
+def section_etag(data) -> str:
+    """Weak ETag of a section's JSON-encoded payload"""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return 'W/"' + hashlib.sha1(body.encode("utf-8")).hexdigest()[:16] + '"'
+
+def parse_section_etags(raw: Optional[str]) -> dict:
+    """Parse `section=etag,section=etag` as sent back by the client"""
+    known = {}
+    if not raw:
+        return known
+    for part in raw.split(","):
+        name, sep, etag = part.strip().partition("=")
+        if sep and name in BOOTSTRAP_SECTIONS:
+            known[name] = etag.strip()
+    return known
+
+@api_router.get("/bootstrap")
+async def bootstrap(request: Request, current_user: TokenClaims = Depends(get_token_claims)):
+    """Everything the app needs on launch in one round trip.
+
+    Sections whose ETag matches the one sent in `X-Section-ETags` are omitted
+    from `data` and listed in `unchanged`; the client keeps its copy.
+    """
+    unit_id = current_user.unit_id
+    me, settings, news, duties, groups = await asyncio.gather(
+        load_user(current_user.id),
+        single_flight.run(scoped(unit_id, "settings"), lambda: load_settings(unit_id), "bootstrap:settings"),
+        single_flight.run(scoped(unit_id, "news"), lambda: load_news(unit_id), "bootstrap:news"),
+        load_user_duties(unit_id, current_user.id),
+        load_user_groups(unit_id, current_user.id),
+    )
+    sections = jsonable_encoder({
+        "me": me,
+        "settings": settings,
+        "news": news,
+        "duties": duties,
+        "groups": groups,
+    })
+    
+    known = parse_section_etags(request.headers.get("x-section-etags"))
+    etags = {name: section_etag(sections[name]) for name in BOOTSTRAP_SECTIONS}
+    overall = section_etag(etags)
+    
+    if request.headers.get("if-none-match") == overall:
+        return Response(status_code=304, headers={"ETag": overall})
+    
+    unchanged = [name for name in BOOTSTRAP_SECTIONS if known.get(name) == etags[name]]
+    payload = {
+        "etags": etags,
+        "unchanged": unchanged,
+        "data": {name: sections[name] for name in BOOTSTRAP_SECTIONS if name not in unchanged},
+    }
+    return JSONResponse(payload, headers={"ETag": overall})
+
+# Slow-query Route
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = 50, current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Most recent slow Mongo operations, newest first"""
+    entries = list(slow_queries)[-limit:]
+    entries.reverse()
+    return {"threshold_ms": SLOW_QUERY_MS, "count": len(entries), "entries": entries}
+
+# Startup profile Route
+@api_router.get("/admin/startup-profile")
+async def get_startup_profile(current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Import and startup hook timings of this worker, in milliseconds"""
+    return startup_profile
+
+# Cache Route
+@api_router.get("/admin/cache")
+async def get_cache_stats(current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Hit rates and sizes per cache namespace for this worker"""
+    stats = {}
+    for namespace, cache in caches.items():
+        lookups = cache.hits + cache.misses
+        stats[namespace] = {
+            "ttl": cache.ttl,
+            "entries": cache_store.size(namespace),
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_rate": round(cache.hits / lookups, 3) if lookups else None,
+        }
+    return {"backend": CACHE_BACKEND, "namespaces": stats}
+
+# Compaction Routes
+@api_router.get("/admin/compaction")
+async def get_compaction_status(current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Pending compactions in this worker and the result of its last orphan sweep"""
+    return {
+        "archive": ORPHAN_DUTIES_ARCHIVE,
+        "queued": compaction_queue.qsize(),
+        "sweep_interval_seconds": ORPHAN_SWEEP_SECONDS,
+        "last_sweep": orphan_sweeps["last"],
+    }
+
+@api_router.post("/admin/compaction/sweep")
+async def run_orphan_sweep(current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Run an orphan sweep now and report what it removed"""
+    return await sweep_orphans()
+
+# Notifications Route
+@api_router.get("/admin/notifications")
+async def get_notification_status(current_user: TokenClaims = Depends(get_fleet_admin_claims)):
+    """Outbox depth by state, plus the latest digests when NOTIFY_SINK=memory"""
+    if notification_sender is None:
+        return {"sink": None}
+    await collect_notification_metrics()
+    status = {
+        "sink": notification_sender.name,
+        "outbox": {labels[0]: value for labels, value in notification_outbox_depth.values.items()},
+    }
+    if isinstance(notification_sender, MemorySender):
+        status["recent"] = list(notification_sender.sent)[-50:]
+    return status
+
+# Audit Route
+@api_router.get("/admin/audit")
+async def get_audit_log(actor_id: Optional[str] = None, action: Optional[str] = None, target_id: Optional[str] = None,
+                        offset: int = Query(0, ge=0, le=10000), limit: int = Query(50, ge=1, le=AUDIT_PAGE_SIZE),
+                        current_user: TokenClaims = Depends(get_admin_claims)):
+    """Audit entries of the caller's unit, newest first. Entries still in a
+    worker's buffer (up to AUDIT_FLUSH_SECONDS old) are not listed yet."""
+    query = {"unit_id": current_user.unit_id}
+    for field, value in (("actor_id", actor_id), ("action", action), ("target_id", target_id)):
+        if value:
+            query[field] = value
+    entries = await db.audit_log.find(query).sort("at", -1).skip(offset).limit(limit + 1).to_list(limit + 1)
+    for entry in entries:
+        entry["id"] = entry.pop("_id")
+    return {
+        "entries": entries[:limit],
+        "offset": offset,
+        "next_offset": offset + limit if len(entries) > limit else None,
+    }
+
+# Metrics Route
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus text exposition; protected by METRICS_TOKEN when set"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    for collect in metrics_collectors:
+        await collect()
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include router
 app.include_router(api_router)
 
@@ -701,14 +3866,72 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "X-Access-Token", "Idempotent-Replayed", "X-Trace-Id"],
 )
 
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+startup_profile["phases"]["module"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
+@app.on_event("startup")
+async def run_maintenance_tasks():
+    """Seeding, migrations and index builds, on whichever worker takes the
+    startup lease first. The others skip them and start serving at once.
+    Tasks already recorded for this deploy are skipped; a failed one is not
+    recorded, so the next start runs it again."""
+    async with lease("startup") as held:
+        if not held:
+            logger.info(f"Startup tasks are running on another worker; {WORKER_ID} skips them")
+            return
+        completed = {doc["_id"]: doc.get("version") async for doc in db.maintenance.find({}, {"version": 1})}
+        runs = {}
+        
+        async def run(name: str):
+            hook, after, config = maintenance_tasks[name]
+            await asyncio.gather(*(runs[dependency] for dependency in after))
+            version = maintenance_version(config)
+            if completed.get(name) == version:
+                return
+            await hook()
+            await db.maintenance.update_one(
+                {"_id": name},
+                {"$set": {"version": version, "completed_at": datetime.now(timezone.utc), "worker": WORKER_ID}},
+                upsert=True)
+        
+        for name in maintenance_tasks:
+            runs[name] = asyncio.ensure_future(run(name))
+        await asyncio.gather(*runs.values())
+
+@app.on_event("startup")
+async def startup_complete():
+    startup_profile["phases"]["ready"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    logger.info(f"Startup profile: {startup_profile['phases']} hooks={startup_profile['hooks']}")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    try:
+        await flush_audit()
+    except Exception as e:
+        logger.error(f"Error draining {len(audit_buffer)} audit entries on shutdown: {e}")
+    if span_exporter is not None:
+        try:
+            await export_traces()
+        except Exception as e:
+            logger.error(f"Error exporting traces on shutdown: {e}")
+    if hash_pool is not None:
+        hash_pool.shutdown(wait=False, cancel_futures=True)
+    if feed_client is not None:
+        await feed_client.aclose()
     client.close()
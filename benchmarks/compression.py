@@ -0,0 +1,90 @@
+"""Bytes on the wire and CPU per request for compressed API payloads.
+
+Compares, for synthetic /news and /duties bodies of realistic size:
+  - identity (no compression)
+  - compressing on every request (what the middleware does for uncached routes)
+  - serving a CachedPayload hit (compressed once, reused)
+
+Run from the repository root:
+    python benchmarks/compression.py [--requests 500]
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from seed import load_server
+
+server = load_server("military_benchmark")
+
+
+def make_news(count=100):
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": str(uuid.uuid4()),
+        "title": f"Новина {i}: навчання підрозділу на полігоні",
+        "content": "Військовослужбовці відпрацювали дії в обороні та взаємодію між підрозділами. " * 3,
+        "image_url": f"https://armyinform.com.ua/wp-content/uploads/2025/10/photo-{i}.jpg",
+        "author_id": "armyinform",
+        "author_name": "ArmyInform",
+        "is_external": True,
+        "external_url": f"https://armyinform.com.ua/2025/10/{i}/news-item/",
+        "source": "armyinform.com.ua",
+        "created_at": (now - timedelta(hours=i)).isoformat(),
+    } for i in range(count)]
+
+
+def make_duties(count=3000, users=200):
+    start = datetime(2025, 1, 1)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    return [{
+        "id": str(uuid.uuid4()),
+        "user_id": user_ids[i % users],
+        "user_name": f"Петренко Іван {i % users}",
+        "duty_date": (start + timedelta(days=i % 365)).date().isoformat(),
+        "created_at": start.isoformat(),
+    } for i in range(count)]
+
+
+def measure(label, body, requests, encoding, cached):
+    entry = server.CachedPayload(body) if cached else None
+    cpu_start = time.process_time()
+    for _ in range(requests):
+        if encoding is None:
+            wire = body
+        elif cached:
+            wire = entry.encode(encoding)
+        else:
+            wire = server.compress_body(body, encoding)
+    cpu = time.process_time() - cpu_start
+    return {
+        "payload": label,
+        "encoding": encoding or "identity",
+        "cached": cached,
+        "bytes": len(wire),
+        "ratio": round(len(wire) / len(body), 3),
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    encodings = ["gzip"] + (["br"] if server.brotli is not None else [])
+    payloads = {"news": make_news(), "duties": make_duties()}
+    results = []
+    for label, data in payloads.items():
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        results.append(measure(label, body, args.requests, None, False))
+        for encoding in encodings:
+            results.append(measure(label, body, args.requests, encoding, False))
+            results.append(measure(label, body, args.requests, encoding, True))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
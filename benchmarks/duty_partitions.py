@@ -0,0 +1,95 @@
+"""Duty read latency and live collection size before and after yearly partitioning.
+
+Seeds a 5-year roster (by default 40 duties a day, the last 60 days of it
+in the future) into a separate benchmark database, times the duty loaders
+the routes use with the cache bypassed, runs the partitioning job, and
+times them again.
+
+Run from the repository root against a local mongod:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/duty_partitions.py > partitions.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import date, timedelta
+
+from load import percentile
+from seed import load_server, seed
+
+
+def scenarios(user_id):
+    today = date.today()
+    month_start = today.replace(day=1)
+    next_month_end = (month_start + timedelta(days=62)).replace(day=1) - timedelta(days=1)
+    new_year = date(today.year, 1, 1)
+    return {
+        "user_current_months": ({"user_id": user_id}, month_start, next_month_end),
+        "roster_current_months": ({}, month_start, next_month_end),
+        "roster_across_new_year": ({}, new_year - timedelta(days=31), new_year + timedelta(days=30)),
+        "user_all": ({"user_id": user_id}, None, None),
+    }
+
+
+async def live_stats(server):
+    stats = await server.db.command("collStats", "duties")
+    return {
+        "count": stats["count"],
+        "size_mb": round(stats["size"] / 2**20, 2),
+        "index_size_mb": round(stats["totalIndexSize"] / 2**20, 2),
+        "partitions": await server.duty_partition_years(),
+    }
+
+
+async def measure(server, user_id, repeat):
+    results = {}
+    for name, (query, date_from, date_to) in scenarios(user_id).items():
+        await server.find_duties(query, date_from, date_to)  # warm up
+        latencies = []
+        rows = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = len(await server.find_duties(query, date_from, date_to))
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        results[name] = {"rows": rows, "p50_ms": percentile(latencies, 0.50), "p95_ms": percentile(latencies, 0.95)}
+        print(f"{name}: {results[name]}", file=sys.stderr)
+    return results
+
+
+async def run(args):
+    server = load_server(args.db)
+    await server.ensure_live_duty_indexes()
+    dataset = await seed(
+        server, args.users, args.groups, args.years * 365, args.duties_per_day, news=0,
+        duty_past_days=args.years * 365 - 60)
+    user = await server.db.users.find_one({"email": "soldier0@benchmark.example.com"}, {"id": 1})
+
+    before = {"live": await live_stats(server), "reads": await measure(server, user["id"], args.repeat)}
+    started = time.perf_counter()
+    moved = await server.partition_duties(settle_seconds=0)  # no other workers to wait for
+    partition_seconds = round(time.perf_counter() - started, 2)
+    after = {"live": await live_stats(server), "reads": await measure(server, user["id"], args.repeat)}
+    return {
+        "dataset": dataset,
+        "partitioning": {"moved": moved, "seconds": partition_seconds},
+        "before": before,
+        "after": after,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="military_benchmark")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--groups", type=int, default=25)
+    parser.add_argument("--duties-per-day", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
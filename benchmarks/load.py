@@ -0,0 +1,167 @@
+"""Concurrent load per API endpoint, reported as JSON.
+
+By default the app is driven in process through httpx's ASGI transport,
+backed by the mongod in MONGO_URL and a separate benchmark database that
+is (re)seeded first. Pass --base-url to load an already running server
+instead, which must have been seeded with benchmarks/seed.py.
+
+    python benchmarks/load.py --requests 2000 --concurrency 50 > before.json
+    git checkout <other commit>
+    python benchmarks/load.py --requests 2000 --concurrency 50 > after.json
+
+Each endpoint result has throughput (requests/s), p50/p95/p99 latency in
+milliseconds and the number of non-2xx responses.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from seed import SEED_PASSWORD, load_server, seed
+
+ADMIN_EMAIL = "sheremet.b.s@gmail.com"
+ADMIN_PASSWORD = "8662196415q"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+async def login(client, email, password):
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    body = response.json()
+    return {"Authorization": f"Bearer {body['access_token']}"}, body["user"]
+
+
+async def scenarios(client):
+    """(name, method, path, headers) for every endpoint under test"""
+    admin_headers, _ = await login(client, ADMIN_EMAIL, ADMIN_PASSWORD)
+    user_headers, user = await login(client, "soldier0@benchmark.example.com", SEED_PASSWORD)
+    gzip_headers = {**user_headers, "Accept-Encoding": "gzip"}
+    groups = (await client.get("/api/groups/my", headers=user_headers)).json()
+    result = [
+        ("settings", "GET", "/api/settings", {}),
+        ("news", "GET", "/api/news", {}),
+        ("news_gzip", "GET", "/api/news", {"Accept-Encoding": "gzip"}),
+        ("bootstrap", "GET", "/api/bootstrap", user_headers),
+        ("duties_all", "GET", "/api/duties", user_headers),
+        ("duties_all_gzip", "GET", "/api/duties", gzip_headers),
+        ("duties_my", "GET", "/api/duties/my", user_headers),
+        ("duties_user", "GET", f"/api/duties/user/{user['id']}", user_headers),
+        ("groups", "GET", "/api/groups", user_headers),
+        ("groups_my", "GET", "/api/groups/my", user_headers),
+        ("users", "GET", "/api/users", admin_headers),
+    ]
+    if groups:
+        result.append(("group_members", "GET", f"/api/groups/{groups[0]['id']}/members", user_headers))
+    return result
+
+
+async def run_endpoint(client, method, path, headers, requests, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers)
+                if response.status_code >= 300:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    server = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60.0)
+        dataset = None
+    else:
+        server = load_server(args.db)
+        await server.app.router.startup()
+        dataset = None if args.skip_seed else await seed(
+            server, args.users, args.groups, args.duty_days, args.duties_per_day, args.news)
+        transport = httpx.ASGITransport(app=server.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60.0)
+
+    results = {}
+    async with client:
+        for name, method, path, headers in await scenarios(client):
+            if args.only and name not in args.only:
+                continue
+            # Warm caches and connection pools before measuring
+            await run_endpoint(client, method, path, headers, min(args.concurrency, args.requests), args.concurrency)
+            results[name] = await run_endpoint(client, method, path, headers, args.requests, args.concurrency)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+
+    if server is not None:
+        await server.app.router.shutdown()
+    return {
+        "revision": git_revision(),
+        "at": datetime.now(timezone.utc).isoformat(),
+        "target": args.base_url or "in-process",
+        "dataset": dataset,
+        "endpoints": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="load a running server instead of the in-process app")
+    parser.add_argument("--db", default="military_benchmark")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--duty-days", type=int, default=365)
+    parser.add_argument("--duties-per-day", type=int, default=40)
+    parser.add_argument("--news", type=int, default=20000)
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Seed a benchmark database with a realistic unit.
+
+Defaults: 2,000 users in 100 groups, a year of duties (40 per day) and
+20,000 news items. Every seeded user shares the password in
+SEED_PASSWORD so the load driver can log in as any of them.
+
+Run from the repository root against a local mongod:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/seed.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+SEED_PASSWORD = "benchmark-password"
+CHUNK = 1000
+
+RANKS = ["солдат", "старший солдат", "молодший сержант", "сержант", "старший сержант", "лейтенант"]
+SURNAMES = ["Петренко", "Коваленко", "Бондаренко", "Шевченко", "Мельник", "Ткаченко", "Кравчук", "Олійник"]
+NAMES = ["Іван", "Олег", "Андрій", "Микола", "Сергій", "Дмитро", "Василь", "Тарас"]
+
+
+def load_server(db_name: str):
+    """Import backend/server.py bound to `db_name`"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["military_db"] = db_name
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+    import server
+    return server
+
+
+async def insert_chunked(collection, docs):
+    for start in range(0, len(docs), CHUNK):
+        await collection.insert_many(docs[start:start + CHUNK], ordered=False)
+
+
+async def seed(server, users=2000, groups=100, duty_days=365, duties_per_day=40, news=20000, rng=None,
+               duty_past_days=None):
+    rng = rng or random.Random(42)
+    db = server.db
+    now = datetime.now(timezone.utc)
+    password = server.get_password_hash(SEED_PASSWORD)
+    unit_id = server.DEFAULT_UNIT_ID
+
+    for name in ("users", "groups", "duties", "news"):
+        await db[name].delete_many({"email": {"$ne": "sheremet.b.s@gmail.com"}} if name == "users" else {})
+    for name in await db.list_collection_names():
+        if name in ("duties_archive", "news_archive") or server.DUTY_PARTITION_NAME.match(name):
+            await db.drop_collection(name)
+    await server.duty_partition_years(refresh=True)
+
+    user_docs = []
+    for i in range(users):
+        user_docs.append({
+            "id": str(uuid.uuid4()),
+            "email": f"soldier{i}@benchmark.example.com",
+            "full_name": f"{rng.choice(SURNAMES)} {rng.choice(NAMES)}",
+            "rank": rng.choice(RANKS),
+            "role": "user",
+            "unit_id": unit_id,
+            "verified": True,
+            "created_at": (now - timedelta(days=rng.randint(0, 700))).isoformat(),
+            "password": password,
+        })
+    await insert_chunked(db.users, user_docs)
+
+    group_docs = []
+    per_group = max(1, users // max(groups, 1))
+    for g in range(groups):
+        members = user_docs[g * per_group:(g + 1) * per_group]
+        group_docs.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Підрозділ {g + 1}",
+            "description": None,
+            "member_ids": [u["id"] for u in members],
+            "unit_id": unit_id,
+            "created_at": now.isoformat(),
+        })
+    await insert_chunked(db.groups, group_docs)
+
+    duty_docs = []
+    first_day = date.today() - timedelta(days=duty_days // 2 if duty_past_days is None else duty_past_days)
+    for d in range(duty_days):
+        duty_date = (first_day + timedelta(days=d)).isoformat()
+        for user in rng.sample(user_docs, min(duties_per_day, len(user_docs))):
+            duty_docs.append({
+                "id": str(uuid.uuid4()),
+                "unit_id": unit_id,
+                "user_id": user["id"],
+                "user_name": user["full_name"],
+                "duty_date": duty_date,
+                "created_at": now.isoformat(),
+            })
+    await insert_chunked(db.duties, duty_docs)
+
+    news_docs = []
+    for i in range(news):
+        external = i % 4 != 0
+        news_docs.append({
+            "id": str(uuid.uuid4()),
+            "title": f"Новина {i}: навчання підрозділу на полігоні",
+            "content": "Військовослужбовці відпрацювали дії в обороні та взаємодію між підрозділами. " * 2,
+            "image_url": f"https://armyinform.com.ua/wp-content/uploads/photo-{i}.jpg" if external else None,
+            "author_id": "armyinform" if external else "benchmark",
+            "author_name": "ArmyInform" if external else "Адміністратор",
+            "is_external": external,
+            "external_url": f"https://armyinform.com.ua/news/{i}/" if external else None,
+            "source": "armyinform.com.ua" if external else None,
+            "unit_id": unit_id,
+            "created_at": (now - timedelta(minutes=30 * i)).isoformat(),
+        })
+    await insert_chunked(db.news, news_docs)
+
+    await db.rosters.delete_many({})
+    server.invalidate_tags("news", "duties", "groups",
+                           *(server.scoped(unit_id, name) for name in ("settings", "users", "rosters")))
+    return {
+        "users": len(user_docs),
+        "groups": len(group_docs),
+        "duties": len(duty_docs),
+        "news": len(news_docs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="military_benchmark")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--duty-days", type=int, default=365)
+    parser.add_argument("--duties-per-day", type=int, default=40)
+    parser.add_argument("--duty-past-days", type=int, help="days of duties before today (default: half)")
+    parser.add_argument("--news", type=int, default=20000)
+    args = parser.parse_args()
+
+    server = load_server(args.db)
+    counts = asyncio.run(seed(
+        server, args.users, args.groups, args.duty_days, args.duties_per_day, args.news,
+        duty_past_days=args.duty_past_days))
+    print(counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Wall-clock time to create users: bulk import vs one registration at a time.
+
+Both runs go through the in-process app against the mongod in MONGO_URL,
+in a separate benchmark database whose users collection is cleared first:
+  - sequential: POST /api/auth/register once per user (the old onboarding path)
+  - import: a single CSV upload to POST /api/users/import
+
+    python benchmarks/user_import.py --users 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from seed import load_server
+
+ADMIN_EMAIL = "sheremet.b.s@gmail.com"
+ADMIN_PASSWORD = "8662196415q"
+
+
+def rows(prefix, count):
+    return [{
+        "email": f"{prefix}{i}@import.example.com",
+        "password": f"import-password-{i}",
+        "full_name": f"Імпорт {i}",
+        "rank": "солдат",
+    } for i in range(count)]
+
+
+async def sequential(client, users):
+    started = time.perf_counter()
+    for user in users:
+        response = await client.post("/api/auth/register", json=user)
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def bulk(client, headers, users):
+    body = "email,password,full_name,rank\n" + "".join(
+        f"{u['email']},{u['password']},{u['full_name']},{u['rank']}\n" for u in users)
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/users/import", content=body.encode(), headers={**headers, "Content-Type": "text/csv"}, timeout=None)
+    response.raise_for_status()
+    summary = json.loads(response.text.splitlines()[-1])["summary"]
+    elapsed = time.perf_counter() - started
+    assert summary["created"] == len(users), summary
+    return elapsed
+
+
+async def run(args):
+    server = load_server(args.db)
+    await server.app.router.startup()
+    await server.db.users.delete_many({"email": {"$regex": "@import\\.example\\.com$"}})
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60.0) as client:
+        response = await client.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = {}
+        if not args.skip_sequential:
+            results["sequential_s"] = round(await sequential(client, rows("seq", args.users)), 2)
+        results["import_s"] = round(await bulk(client, headers, rows("bulk", args.users)), 2)
+        if "sequential_s" in results:
+            results["speedup"] = round(results["sequential_s"] / results["import_s"], 1)
+
+    await server.db.users.delete_many({"email": {"$regex": "@import\\.example\\.com$"}})
+    await server.app.router.shutdown()
+    return {"users": args.users, "hash_workers": server.IMPORT_HASH_WORKERS, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="military_benchmark")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,12 @@ import { Toaster } from "@/components/ui/sonner";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 export const API = `${BACKEND_URL}/api`;
 
+// Deployments serving several units pick this build's unit for anonymous
+// requests; once signed in the server takes the unit from the token.
+if (process.env.REACT_APP_UNIT_ID) {
+  axios.defaults.headers.common["X-Unit-Id"] = process.env.REACT_APP_UNIT_ID;
+}
+
 export const AuthContext = React.createContext();
 
 function App() {
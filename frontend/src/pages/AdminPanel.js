@@ -93,7 +93,7 @@ const AdminPanel = () => {
       if (editingNews) {
         // Update existing news
         await axios.put(`${API}/news/${editingNews.id}`, newsForm, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}`, "If-Match": `"${editingNews.version ?? 0}"` }
         });
         toast.success("Новость обновлена!");
         setEditingNews(null);
@@ -131,7 +131,7 @@ const AdminPanel = () => {
     const token = localStorage.getItem("token");
     
     try {
-      const response = await axios.post(`${API}/news/sync-armyinform`, {}, {
+      const response = await axios.post(`${API}/news/sync`, {}, {
         headers: { Authorization: `Bearer ${token}` }
       });
       
@@ -286,7 +286,7 @@ const AdminPanel = () => {
 
     try {
       await axios.put(`${API}/settings`, settings, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}`, "If-Match": `"${settings.version ?? 0}"` }
       });
 
       toast.success("Настройки обновлены!");
@@ -319,7 +319,7 @@ const AdminPanel = () => {
       if (editingUser) {
         // Update existing user
         await axios.put(`${API}/users/${editingUser.id}`, userForm, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}`, "If-Match": `"${editingUser.version ?? 0}"` }
         });
         toast.success("Користувача оновлено!");
         setEditingUser(null);
@@ -366,7 +366,7 @@ const AdminPanel = () => {
     try {
       if (editingGroup) {
         await axios.put(`${API}/groups/${editingGroup.id}`, groupForm, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}`, "If-Match": `"${editingGroup.version ?? 0}"` }
         });
         toast.success("Группа обновлена!");
         setEditingGroup(null);
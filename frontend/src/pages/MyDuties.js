@@ -10,7 +10,7 @@ import { ru } from "date-fns/locale";
 const MyDuties = () => {
   const [duties, setDuties] = useState([]);
   const [myGroups, setMyGroups] = useState([]);
-  const [allDuties, setAllDuties] = useState([]);
+  const [monthRoster, setMonthRoster] = useState({});
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const { user } = useContext(AuthContext);
@@ -24,15 +24,15 @@ const MyDuties = () => {
     const config = { headers: { Authorization: `Bearer ${token}` } };
 
     try {
-      const [dutiesRes, groupsRes, allDutiesRes] = await Promise.all([
+      const [dutiesRes, groupsRes, rosterRes] = await Promise.all([
         axios.get(`${API}/duties/my`, config),
         axios.get(`${API}/groups/my`, config),
-        axios.get(`${API}/duties`, config)
+        axios.get(`${API}/duties/roster/${format(new Date(), "yyyy-MM")}`, config)
       ]);
 
       setDuties(dutiesRes.data);
       setMyGroups(groupsRes.data);
-      setAllDuties(allDutiesRes.data);
+      setMonthRoster(rosterRes.data.days);
 
       // Fetch members for all groups
       if (groupsRes.data.length > 0) {
@@ -65,9 +65,8 @@ const MyDuties = () => {
   };
 
   const getDutiesForUserAndDay = (userId, date) => {
-    return allDuties.filter(duty => {
-      return duty.user_id === userId && duty.duty_date === format(date, "yyyy-MM-dd");
-    });
+    const dayDuties = monthRoster[format(date, "yyyy-MM-dd")] || [];
+    return dayDuties.filter(duty => duty.user_id === userId);
   };
 
   const renderMonthSchedule = (group) => {
@@ -72,6 +72,12 @@ const Profile = () => {
         headers: { Authorization: `Bearer ${token}` }
       });
 
+      // Changing email or password revokes the old token; the server sends a new one
+      const refreshedToken = response.headers["x-access-token"];
+      if (refreshedToken) {
+        localStorage.setItem("token", refreshedToken);
+      }
+
       setUser(response.data);
       toast.success("Профиль обновлен!");
       setFormData({ ...formData, password: "", confirmPassword: "" });
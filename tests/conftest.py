@@ -0,0 +1,27 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("military_db", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An in-memory database in place of the Motor one"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    mock = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", mock)
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def clean_token_versions():
+    server.token_versions.clear()
+    yield
+    server.token_versions.clear()
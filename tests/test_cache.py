@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+import server
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        store = server.SqliteCacheStore(str(tmp_path / "cache.sqlite3"))
+    else:
+        store = server.MemoryCacheStore()
+    monkeypatch.setattr(server, "cache_store", store)
+    return store
+
+
+@pytest.fixture
+def cache():
+    cache = server.Cache("test_payloads", max_entries=10)
+    yield cache
+    server.caches.pop("test_payloads", None)
+
+
+def gzip_request():
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]})
+
+
+def big_payload():
+    return server.CachedPayload(b"x" * (server.COMPRESS_MIN_SIZE * 2))
+
+
+def test_invalidated_tag_turns_entry_into_miss(store, cache):
+    cache.put("k", "value", ("roster",))
+    assert cache.get("k") == "value"
+
+    server.invalidate_tags("roster")
+
+    assert cache.get("k") is None
+
+
+def test_put_with_versions_from_before_a_write_is_a_miss(store, cache):
+    versions = store.tag_versions(("roster",))
+    server.invalidate_tags("roster")
+
+    cache.put("k", "stale", ("roster",), versions)
+
+    assert cache.get("k") is None
+
+
+def test_write_during_load_is_not_masked_by_stored_variant(store, cache):
+    async def render():
+        server.invalidate_tags("roster")  # a write lands while we render
+        return big_payload()
+
+    response = asyncio.run(server.cached_payload_response(
+        gzip_request(), cache, "k", render, ("roster",), "application/json"))
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert cache.get("k") is None
+
+
+def test_stored_variant_is_reused(store, cache):
+    async def render():
+        return big_payload()
+
+    asyncio.run(server.cached_payload_response(
+        gzip_request(), cache, "k", render, ("roster",), "application/json"))
+
+    entry = cache.get("k")
+    assert entry is not None
+    if store.shared:
+        assert "gzip" in entry.encoded
+
+
+def test_single_flight_labels_do_not_carry_keys(store, cache):
+    async def load():
+        return "value"
+
+    async def fill():
+        for unit in range(5):
+            await cache.get_or_load(f"bogus-{unit}:settings", load)
+
+    asyncio.run(fill())
+
+    labels = {labels[0] for labels in server.singleflight_calls.values}
+    assert "test_payloads" in labels
+    assert not any("bogus" in label for label in labels)
+
+
+def test_ranged_payloads_do_not_evict_fixed_ones(store, db):
+    from fastapi.testclient import TestClient
+
+    admin = {"id": "a1", "email": "a1@example.com", "role": "admin", "unit_id": "default", "token_version": 0}
+    asyncio.run(db.users.insert_one(dict(admin)))
+    client = TestClient(server.app)
+    headers = {"Authorization": f"Bearer {server.create_user_token(admin)}"}
+    settings_key = server.scoped(server.DEFAULT_UNIT_ID, "settings")
+
+    client.get("/api/settings")
+    for day in range(1, server.payload_cache.max_entries + 20):
+        client.get("/api/duties", params={"from": "2026-01-01", "to": f"2026-{1 + day // 28:02d}-{1 + day % 28:02d}"},
+                   headers=headers)
+
+    assert server.payload_cache.get(settings_key) is not None
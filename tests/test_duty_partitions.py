@@ -0,0 +1,47 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import server
+
+
+@pytest.fixture(autouse=True)
+def partition_cache(monkeypatch):
+    monkeypatch.setattr(server, "duty_partition_cache", {"years": None, "expires": 0.0})
+
+
+def test_partition_years_are_cached(db, monkeypatch):
+    calls = []
+
+    async def names():
+        calls.append(1)
+        return ["duties_2020"]
+
+    monkeypatch.setattr(server, "duty_partition_names", names)
+
+    async def read():
+        for _ in range(5):
+            await server.duty_collections("2020-01-01", "2020-12-31")
+
+    asyncio.run(read())
+
+    assert len(calls) == 1
+    assert asyncio.run(server.duty_partition_years(refresh=True)) == [2020]
+    assert len(calls) == 2
+
+
+def test_partitioning_refreshes_cache(db):
+    old_year = date.today().year - 3
+    duties = [{"id": str(day), "unit_id": "default", "user_id": "u1", "duty_date": f"{old_year}-03-{day:02d}"}
+              for day in range(1, 6)]
+    asyncio.run(db.duties.insert_many(duties))
+    assert asyncio.run(server.duty_partition_years()) == []
+
+    moved = asyncio.run(server.partition_duties(settle_seconds=0))
+
+    assert moved == {old_year: 5}
+    # Every year from the oldest duty up to the live window gets a partition
+    assert asyncio.run(server.duty_partition_years())[0] == old_year
+    found = asyncio.run(server.find_duties({"user_id": "u1"}, f"{old_year}-01-01", f"{old_year}-12-31"))
+    assert [duty["id"] for duty in found] == ["1", "2", "3", "4", "5"]
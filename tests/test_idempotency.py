@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def abandoned_record(age_seconds, **fields):
+    claimed_at = datetime.now(timezone.utc) - timedelta(seconds=age_seconds)
+    return {"_id": "duties:u1:key", "fingerprint": "fp", "state": "pending", "claim": "dead-worker",
+            "claimed_at": claimed_at, "created_at": claimed_at, **fields}
+
+
+async def action():
+    return {"created": 1}
+
+
+def test_abandoned_claim_is_taken_over(db):
+    asyncio.run(db.idempotency_keys.insert_one(abandoned_record(server.IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS + 5)))
+
+    assert asyncio.run(server.execute_idempotent("duties:u1:key", "fp", action)) == {"created": 1}
+
+    record = asyncio.run(db.idempotency_keys.find_one({"_id": "duties:u1:key"}))
+    assert record["state"] == "done"
+    assert record["body"] == {"created": 1}
+
+
+def test_legacy_pending_record_without_claim_is_taken_over(db):
+    record = abandoned_record(server.IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS + 5)
+    del record["claim"], record["claimed_at"]
+    asyncio.run(db.idempotency_keys.insert_one(record))
+
+    assert asyncio.run(server.execute_idempotent("duties:u1:key", "fp", action)) == {"created": 1}
+
+
+def test_live_claim_is_not_taken_over(db, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_WAIT_SECONDS", 0)
+    asyncio.run(db.idempotency_keys.insert_one(abandoned_record(1)))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.execute_idempotent("duties:u1:key", "fp", action))
+
+    assert error.value.detail == "Original request is still in progress"
+
+
+def test_waiting_retry_is_released_when_claim_expires(db):
+    asyncio.run(db.idempotency_keys.insert_one(abandoned_record(server.IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS + 5)))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.replay_idempotent("duties:u1:key", "fp"))
+
+    assert error.value.status_code == 409
+    assert error.value.headers["Retry-After"] == "1"
+
+
+def test_claim_is_renewed_while_running(db, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", 0.15)
+    claimed = []
+
+    async def slow_action():
+        record = await db.idempotency_keys.find_one({"_id": "duties:u1:key"})
+        claimed.append(record["claimed_at"])
+        await asyncio.sleep(0.2)
+        record = await db.idempotency_keys.find_one({"_id": "duties:u1:key"})
+        claimed.append(record["claimed_at"])
+        return {}
+
+    asyncio.run(server.execute_idempotent("duties:u1:key", "fp", slow_action))
+
+    assert claimed[1] > claimed[0]
@@ -0,0 +1,57 @@
+import asyncio
+import ipaddress
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+
+@pytest.fixture
+def limiters(monkeypatch):
+    limiters = {
+        "email": server.MemoryTokenBuckets("email", 5, 5),
+        "ip": server.MemoryTokenBuckets("ip", 60, 2),
+    }
+    monkeypatch.setattr(server, "login_limiters", limiters)
+    return limiters
+
+
+def request_from(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers, "client": (peer, 1234)})
+
+
+def test_buckets_are_bounded_by_max_keys():
+    buckets = server.MemoryTokenBuckets("ip", 60, 5, max_keys=3)
+    for key in ("a", "b", "c", "a", "d"):
+        asyncio.run(buckets.take(key))
+
+    assert list(buckets.buckets) == ["c", "a", "d"]
+
+
+def test_throttled_ip_does_not_charge_email_bucket(limiters):
+    for _ in range(2):
+        asyncio.run(server.check_login_rate("user@example.com", "1.2.3.4"))
+    for _ in range(10):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(server.check_login_rate("user@example.com", "1.2.3.4"))
+        assert error.value.status_code == 429
+
+    # The account can still be logged into from elsewhere
+    asyncio.run(server.check_login_rate("user@example.com", "5.6.7.8"))
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [])
+
+    assert server.client_address(request_from("10.0.0.5", "1.2.3.4")) == "10.0.0.5"
+
+
+def test_forwarded_for_is_read_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+    # The client-supplied first hop is not trusted over the last untrusted one
+    assert server.client_address(request_from("10.0.0.5", "9.9.9.9, 1.2.3.4, 10.0.0.7")) == "1.2.3.4"
+    assert server.client_address(request_from("8.8.8.8", "1.2.3.4")) == "8.8.8.8"
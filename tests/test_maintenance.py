@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(server, "maintenance_tasks", registry)
+    return registry
+
+
+def register(log, name, delay=0.0, **options):
+    async def hook():
+        log.append(f"{name}:start")
+        await asyncio.sleep(delay)
+        log.append(f"{name}:end")
+    hook.__name__ = name
+    server.maintenance_task(**options)(hook)
+
+
+def test_tasks_run_concurrently_after_their_dependencies(db, tasks):
+    log = []
+    register(log, "migrate", delay=0.05)
+    register(log, "indexes", after=("migrate",))
+    register(log, "other", delay=0.01)
+
+    asyncio.run(server.run_maintenance_tasks())
+
+    assert log.index("other:start") < log.index("migrate:end")
+    assert log.index("migrate:end") < log.index("indexes:start")
+
+
+def test_completed_tasks_are_skipped_until_deploy_or_config_changes(db, tasks, monkeypatch):
+    log = []
+    register(log, "seed", config=("NOTIFY_SINK",))
+
+    asyncio.run(server.run_maintenance_tasks())
+    asyncio.run(server.run_maintenance_tasks())
+    assert log == ["seed:start", "seed:end"]
+
+    monkeypatch.setattr(server, "NOTIFY_SINK", "memory-changed")
+    asyncio.run(server.run_maintenance_tasks())
+    assert len(log) == 4
+
+    monkeypatch.setattr(server, "DEPLOY_ID", "next-deploy")
+    asyncio.run(server.run_maintenance_tasks())
+    assert len(log) == 6
+
+
+def test_failed_task_is_not_recorded(db, tasks):
+    async def broken():
+        raise RuntimeError("index build failed")
+    server.maintenance_task(broken)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.run_maintenance_tasks())
+
+    assert asyncio.run(db.maintenance.find_one({"_id": "broken"})) is None
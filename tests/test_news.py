@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def news(news_id, age_days):
+    created_at = datetime(2026, 1, 1, tzinfo=timezone.utc) - timedelta(days=age_days)
+    return {"id": news_id, "title": news_id, "content": "...", "author_id": "a", "author_name": "A",
+            "unit_id": server.DEFAULT_UNIT_ID, "created_at": created_at.isoformat()}
+
+
+def test_default_page_agrees_with_later_pages(db):
+    # Old local items stay hot; newer external ones were already archived
+    asyncio.run(db.news.insert_many([news(f"n{i}", 100 + i) for i in range(3)]))
+    asyncio.run(db.news_archive.insert_many([news(f"n1{i}", 40 + i) for i in range(3)]))
+    server.invalidate_payloads(server.scoped(server.DEFAULT_UNIT_ID, "news"))
+    client = TestClient(server.app)
+
+    def ids(params=None):
+        return [item["id"] for item in client.get("/api/news", params=params).json()]
+
+    first_page = ids()
+    assert first_page == ["n10", "n11", "n12", "n0", "n1", "n2"]
+    assert ids({"limit": 2}) + ids({"limit": 2, "offset": 2}) + ids({"limit": 2, "offset": 4}) == first_page
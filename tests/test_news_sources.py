@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+
+PUBLIC = "93.184.216.34"
+
+
+@pytest.fixture
+def feed_client(monkeypatch):
+    """A feed client answering from `routes` (path -> response) and recording requests"""
+    routes = {}
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return routes[request.url.path]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(server, "feed_client", client)
+    monkeypatch.setattr(server, "NEWS_FETCH_ALLOW_PRIVATE", False)
+    return routes, seen
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "localhost", "169.254.169.254", "10.0.0.5", "::1", "::ffff:127.0.0.1"])
+def test_non_public_addresses_are_refused(host):
+    with pytest.raises(ValueError):
+        asyncio.run(server.resolve_public_address(host))
+
+
+def test_fetch_connects_to_checked_address_with_original_host(feed_client):
+    routes, seen = feed_client
+    routes["/feed"] = httpx.Response(200, text="<rss/>")
+
+    response = asyncio.run(server.fetch_url(f"http://{PUBLIC}:8080/feed"))
+
+    assert response.text == "<rss/>"
+    assert seen[0].url.host == PUBLIC
+    assert seen[0].headers["host"] == f"{PUBLIC}:8080"
+    assert seen[0].extensions["sni_hostname"] == PUBLIC
+
+
+def test_redirect_to_internal_address_is_refused(feed_client):
+    routes, seen = feed_client
+    routes["/feed"] = httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/meta-data"})
+
+    with pytest.raises(ValueError, match="non-public"):
+        asyncio.run(server.fetch_url(f"http://{PUBLIC}/feed"))
+    assert len(seen) == 1
+
+
+def test_relative_redirect_keeps_host(feed_client):
+    routes, seen = feed_client
+    routes["/feed"] = httpx.Response(301, headers={"Location": "/feed/"})
+    routes["/feed/"] = httpx.Response(200, text="ok")
+
+    assert asyncio.run(server.fetch_url(f"http://{PUBLIC}/feed")).text == "ok"
+    assert [request.url.path for request in seen] == ["/feed", "/feed/"]
+
+
+def test_internal_feed_is_reported_not_fetched(db, feed_client):
+    routes, seen = feed_client
+    source = server.news_source_doc(server.NewsSource(
+        name="Metadata", feed_url="http://169.254.169.254/latest/", source="x", author_id="x",
+        unit_id="alpha"))
+    asyncio.run(db.news_sources.insert_one(dict(source)))
+
+    report = asyncio.run(server.ingest_source(source))
+
+    assert "non-public" in report["error"]
+    assert seen == []
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def duty(duty_id, day, user_id):
+    return {"id": duty_id, "unit_id": server.DEFAULT_UNIT_ID, "user_id": user_id, "user_name": user_id.upper(),
+            "duty_date": f"2026-03-{day:02d}"}
+
+
+@pytest.fixture
+def write_during_build(db, monkeypatch):
+    """Make the first duties read of a rebuild race with a duty write"""
+    find_duties = server.find_duties
+    raced = []
+
+    async def racing_find_duties(*args, **kwargs):
+        duties = await find_duties(*args, **kwargs)
+        if not raced:
+            raced.append(1)
+            late = duty("late", 2, "u2")
+            await db.duties.insert_one(dict(late))
+            await server.roster_add([late])
+        return duties
+
+    monkeypatch.setattr(server, "find_duties", racing_find_duties)
+
+
+def user_ids(roster):
+    return sorted(entry["user_id"] for entries in roster["days"].values() for entry in entries)
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_duty_written_during_rebuild_is_not_lost(db, write_during_build, existing):
+    asyncio.run(db.duties.insert_one(duty("early", 1, "u1")))
+    if existing:
+        stale = {"_id": server.scoped(server.DEFAULT_UNIT_ID, "2026-03"), "unit_id": server.DEFAULT_UNIT_ID,
+                 "days": {}, "names": {}, "built_at": "2000-01-01T00:00:00+00:00"}
+        asyncio.run(db.rosters.insert_one(stale))
+
+    first = asyncio.run(server.load_roster(server.DEFAULT_UNIT_ID, "2026-03"))
+    second = asyncio.run(server.load_roster(server.DEFAULT_UNIT_ID, "2026-03"))
+
+    assert user_ids(first) == ["u1"]
+    assert user_ids(second) == ["u1", "u2"]
+
+
+def test_patches_keep_built_month_current(db):
+    asyncio.run(db.duties.insert_one(duty("early", 1, "u1")))
+    asyncio.run(server.load_roster(server.DEFAULT_UNIT_ID, "2026-03"))
+
+    asyncio.run(server.roster_add([duty("next", 3, "u3")]))
+
+    assert user_ids(asyncio.run(server.load_roster(server.DEFAULT_UNIT_ID, "2026-03"))) == ["u1", "u3"]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+def claims_for(token):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(server.get_token_claims(credentials))
+
+
+def user_doc(version):
+    return {"id": "u1", "email": "u1@example.com", "role": "user", "token_version": version}
+
+
+def test_token_issued_after_refresh_on_another_worker_is_accepted(db):
+    asyncio.run(db.users.insert_one(user_doc(1)))
+    server.token_versions["u1"] = 0  # this worker's cache predates the bump
+
+    claims = claims_for(server.create_user_token(user_doc(1)))
+
+    assert claims.token_version == 1
+    assert server.token_versions["u1"] == 1
+
+
+def test_token_older_than_cache_is_revoked(db):
+    asyncio.run(db.users.insert_one(user_doc(1)))
+    server.token_versions["u1"] = 1
+
+    with pytest.raises(HTTPException) as error:
+        claims_for(server.create_user_token(user_doc(0)))
+    assert error.value.status_code == 401
+    assert error.value.detail == "Token revoked"
+
+
+def test_token_newer_than_database_is_rejected(db):
+    asyncio.run(db.users.insert_one(user_doc(1)))
+    server.token_versions["u1"] = 1
+
+    with pytest.raises(HTTPException) as error:
+        claims_for(server.create_user_token(user_doc(2)))
+    assert error.value.status_code == 401
+
+
+def test_user_created_after_refresh_is_found(db):
+    asyncio.run(db.users.insert_one(user_doc(0)))
+    server.token_versions["u1"] = None  # deleted as far as the last refresh knew
+
+    assert claims_for(server.create_user_token(user_doc(0))).id == "u1"
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+def claims(unit_id, role="admin"):
+    return server.TokenClaims(id="u1", email="u1@example.com", role=role, unit_id=unit_id, token_version=0)
+
+
+def test_fleet_routes_require_default_unit_admin():
+    assert asyncio.run(server.get_fleet_admin_claims(claims(server.DEFAULT_UNIT_ID))).unit_id == server.DEFAULT_UNIT_ID
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_fleet_admin_claims(claims("other-unit")))
+    assert error.value.status_code == 403
+
+
+def test_email_index_is_unique(db):
+    asyncio.run(server.ensure_unit_indexes.__wrapped__())
+    asyncio.run(db.users.insert_one({"id": "a", "email": "dup@example.com"}))
+
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(db.users.insert_one({"id": "b", "email": "dup@example.com"}))
+
+
+def test_token_unit_wins_over_missing_header(db):
+    from fastapi.testclient import TestClient
+
+    alpha_admin = {"id": "a1", "email": "a1@example.com", "role": "admin", "unit_id": "alpha", "token_version": 0}
+    news = {"id": "n1", "title": "Alpha news", "content": "...", "author_id": "a1", "author_name": "A",
+            "unit_id": "alpha", "created_at": "2026-01-01T00:00:00+00:00"}
+    settings = server.default_settings("alpha").model_copy(update={"unit_name": "Alpha"}).model_dump()
+    settings["updated_at"] = settings["updated_at"].isoformat()
+    asyncio.run(db.news.insert_one(news))
+    asyncio.run(db.settings.insert_one(settings))
+    client = TestClient(server.app)
+    headers = {"Authorization": f"Bearer {server.create_user_token(alpha_admin)}"}
+
+    assert [item["id"] for item in client.get("/api/news", headers=headers).json()] == ["n1"]
+    assert client.get("/api/settings", headers=headers).json()["unit_name"] == "Alpha"
+    # Anonymous callers still pick the unit with X-Unit-Id, and an invalid token counts as none
+    assert client.get("/api/settings", headers={"X-Unit-Id": "alpha"}).json()["unit_name"] == "Alpha"
+    bad = {"Authorization": "Bearer nonsense", "X-Unit-Id": "alpha"}
+    assert client.get("/api/settings", headers=bad).json()["unit_name"] == "Alpha"
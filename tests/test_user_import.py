@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def hash_pool(monkeypatch):
+    monkeypatch.setattr(server, "IMPORT_HASH_WORKERS", 1)
+    yield
+    if server.hash_pool is not None:
+        server.hash_pool.shutdown()
+        server.hash_pool = None
+
+
+def admin():
+    return server.TokenClaims(id="admin", email="admin@example.com", role="admin",
+                              unit_id=server.DEFAULT_UNIT_ID, token_version=0)
+
+
+async def run_import(rows):
+    return [json.loads(line) async for line in server.import_users(rows, None, admin())]
+
+
+def test_concurrent_imports_of_one_email_create_one_user(db, hash_pool):
+    asyncio.run(server.ensure_unit_indexes.__wrapped__())
+    rows = [{"email": "new@example.com", "password": "secret123", "full_name": "New Soldier"}]
+
+    async def both():
+        return await asyncio.gather(run_import(rows), run_import(rows))
+
+    results = asyncio.run(both())
+
+    statuses = sorted(lines[0]["status"] for lines in results)
+    assert statuses == ["created", "exists"]
+    user = asyncio.run(db.users.find_one({"email": "new@example.com"}))
+    assert server.verify_password("secret123", user["password"])
+
+
+def test_csv_with_trailing_commas_is_parsed(db, hash_pool):
+    body = ("email,password,full_name,rank\n"
+            "one@example.com,secret123,First Soldier,,\n"
+            "bad-email,secret123,Second Soldier,\n").encode("utf-8")
+
+    rows, group_id = server.parse_import_rows(body, "text/csv")
+    lines = asyncio.run(run_import(rows))
+
+    assert group_id is None
+    assert {line["row"]: line["status"] for line in lines[:-1]} == {0: "created", 1: "invalid"}
+    assert lines[-1]["summary"] == {"created": 1, "exists": 0, "invalid": 1}
+
+
+def test_row_with_non_string_keys_is_reported_invalid(db, hash_pool):
+    lines = asyncio.run(run_import([{None: [""], "email": "x@example.com"}]))
+
+    assert lines[0]["status"] == "invalid"
+    assert lines[-1]["summary"]["invalid"] == 1